@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -7,12 +9,80 @@ class Settings(BaseSettings):
     session_expire_days: int = 30
 
     cookie_name: str = "backchannel_session"
+    token_cache_size: int = 1024
+    token_cache_ttl: float = 300.0
+    password_hash_workers: int = 2
+    password_hash_queue: int = 16
+    login_max_failures: int = 5
+    login_lockout: float = 300.0
+    client_token_key: str = ""
+    client_token_required: bool = False
     allowed_origins: str
 
+    database_url: str = ""
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_statement_cache_size: int = 100
+    db_read_pool_size: int = 5
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    sqlite_cache_size: int = -64000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_busy_timeout: int = 5000
+
     port_range_start: int = 20000
     port_range_end: int = 20100
     local_address: str = "0.0.0.0"
 
+    client_flush_interval: float = 5.0
+    liveness_stale_after: float = 60.0
+    liveness_offline_after: float = 300.0
+    liveness_tick: float = 1.0
+    liveness_wheel_slots: int = 512
+    fleet_stream_interval: float = 1.0
+    long_poll_max_wait: float = 30.0
+    long_poll_max_parked: int = 10000
+
+    client_ws_ping_interval: float = 20.0
+    client_ws_timeout: float = 60.0
+    client_ws_touch_interval: float = 30.0
+
+    metric_queue_size: int = 10000
+    metric_flush_interval: float = 1.0
+
+    metric_history_buffer: int = 120
+    metric_history_flush_interval: float = 10.0
+    metric_prune_interval: float = 3600.0
+    metric_retention_raw: int = 24 * 60 * 60
+    metric_retention_minute: int = 7 * 24 * 60 * 60
+    metric_retention_hour: int = 90 * 24 * 60 * 60
+
+    max_forwarders: int = 50
+    forwarder_directory: Literal["local", "database"] = "local"
+    forwarder_sync_interval: float = 0.5
+    forwarder_owner_timeout: float = 30.0
+
+    relay_engine: Literal["auto", "splice", "socket", "stream"] = "auto"
+    relay_buffer_size: int = 65536
+    relay_debug_log: bool = False
+    traffic_report_interval: float = 5.0
+    event_buffer_size: int = 1000
+    tunnel_idle_timeout: float = 0.0
+    tunnel_max_lifetime: float = 0.0
+    tunnel_bandwidth_limit: int = 0
+    tunnel_global_bandwidth_limit: int = 0
+    mux_window_size: int = 262144
+    mux_max_streams: int = 64
+    standby_port: int = 0
+    standby_clients: str = "*"
+    standby_max_per_client: int = 1
+    standby_max_total: int = 100
+    standby_keepalive_interval: float = 25.0
+    standby_max_age: float = 600.0
+    standby_handover_timeout: float = 2.0
+    # /metrics shows client names and traffic; it is disabled until set
+    metrics_token: str = ""
+    loop_lag_interval: float = 0.5
+
     custom_messages: str = (
         "Connect: ssh {username}@localhost -p {port},"
         "Dynamic port forward: ssh -D 9999 {username}@localhost -p {port} -t top"
@@ -25,4 +95,4 @@ class Settings(BaseSettings):
         return [origin.strip() for origin in self.allowed_origins.split(",")]
 
 
-settings = Settings() # type: ignore[call-arg]
+settings = Settings()  # type: ignore[call-arg]
@@ -0,0 +1,18 @@
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+
+class SchemaJSONResponse(JSONResponse):
+    """JSON response encoded by pydantic-core
+
+    The default response class of the app. The content FastAPI hands over
+    (or a schema returned as-is) is encoded to bytes in one pass of the
+    serializer the schemas already use, instead of `json.dumps`. Schemas
+    are written with their camelCase aliases; NaN and infinity become
+    `null` so the body stays valid JSON.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content, inf_nan_mode="null")
@@ -1,8 +1,15 @@
+import asyncio
 import base64
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-from typing import Optional
+from typing import Any, Optional
 
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Request, status
+from fastapi.security import SecurityScopes
 from fastapi_login import LoginManager
 from passlib.context import CryptContext
 
@@ -10,12 +17,217 @@ from app.core.config import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-manager = LoginManager(
+
+class TokenCache:
+    """Bounded LRU of session tokens that already passed verification
+
+    Entries are keyed by the SHA-256 digest of the token, so the cache
+    never holds a usable credential. An entry is trusted for `ttl`
+    seconds, but never beyond the `exp` of its token.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[bytes, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Any | None:
+        key = hashlib.sha256(token.encode()).digest()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, user = entry
+            if expires > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return user
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, user: Any, expires: float | None = None) -> None:
+        if self.size <= 0:
+            return
+        deadline = time.time() + self.ttl
+        if expires is not None:
+            deadline = min(deadline, expires)
+        key = hashlib.sha256(token.encode()).digest()
+        self._entries[key] = (deadline, user)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+class CachedLoginManager(LoginManager):
+    """`LoginManager` that remembers the tokens it verified
+
+    The dashboard sends the same cookie with every `/manage` request;
+    after the first one, authenticating it is a digest and a dict lookup
+    instead of a JWT decode and a user lookup.
+    """
+
+    def __init__(self, *args: Any, cache: TokenCache, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.token_cache = cache
+
+    async def get_current_user(self, token: str) -> Any:
+        user = self.token_cache.get(token)
+        if user is None:
+            payload = self._get_payload(token)
+            user = await self._get_current_user(payload)
+            self.token_cache.put(token, user, payload.get("exp"))
+        return user
+
+    async def __call__(
+        self,
+        request: Request,
+        security_scopes: SecurityScopes = None,  # type: ignore[assignment]
+    ) -> Any:
+        if security_scopes is not None and security_scopes.scopes:
+            return await super().__call__(request, security_scopes)
+        return await self.get_current_user(await self._get_token(request))
+
+
+manager = CachedLoginManager(
     settings.secret_key,
     token_url="/api/v1/auth/login",
     use_cookie=True,
     cookie_name=settings.cookie_name,
+    cache=TokenCache(settings.token_cache_size, settings.token_cache_ttl),
+)
+
+
+class LoginBusyError(Exception):
+    """Too many login attempts are already waiting for a password check."""
+
+
+class PasswordVerifier:
+    """Checks login passwords on a dedicated, bounded thread pool
+
+    bcrypt is slow on purpose; on FastAPI's shared threadpool a burst of
+    logins would starve the sync endpoints. At most `workers` checks run
+    at once and `queue` more may wait, further attempts are refused with
+    `LoginBusyError` instead of piling up.
+    """
+
+    def __init__(self, workers: int, queue: int) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password"
+        )
+        self._limit = workers + queue
+        self._pending = 0
+        self.rejected = 0
+
+    async def verify(self, password: str) -> bool:
+        if self._pending >= self._limit:
+            self.rejected += 1
+            raise LoginBusyError()
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, verify_master_password, password
+            )
+        finally:
+            self._pending -= 1
+
+
+class LoginThrottle:
+    """Locks an IP address out after repeated failed logins
+
+    `max_failures` failures lock the address out until `lockout` seconds
+    have passed since the last one; a successful login clears the count.
+    Addresses quiet for longer than `lockout` are forgotten.
+    """
+
+    MAX_TRACKED = 10000
+
+    def __init__(self, max_failures: int, lockout: float) -> None:
+        self.max_failures = max_failures
+        self.lockout = lockout
+        self.rejected = 0
+        self._failures: dict[str, tuple[int, float]] = {}
+
+    def retry_after(self, address: str) -> float:
+        """Seconds until the address may try again, 0 when it is not locked out"""
+        count, last = self._failures.get(address, (0, 0.0))
+        remaining = last + self.lockout - time.monotonic()
+        if count < self.max_failures or remaining <= 0:
+            return 0.0
+        self.rejected += 1
+        return remaining
+
+    def failure(self, address: str) -> None:
+        now = time.monotonic()
+        count, last = self._failures.pop(address, (0, now))
+        if now - last >= self.lockout:
+            count = 0
+        self._failures[address] = (count + 1, now)
+        if len(self._failures) > self.MAX_TRACKED:
+            self._forget(now)
+
+    def success(self, address: str) -> None:
+        self._failures.pop(address, None)
+
+    def _forget(self, now: float) -> None:
+        # Entries are ordered by their last failure, oldest first
+        for address, (_, last) in list(self._failures.items()):
+            if now - last < self.lockout and len(self._failures) <= self.MAX_TRACKED:
+                break
+            del self._failures[address]
+
+
+class ClientTokenSigner:
+    """Issues and checks the per-client tokens
+
+    A token is `v1.` followed by the base64url HMAC-SHA256 of the client
+    name, so checking one is a keyed hash of the name with no database
+    lookup. The HMAC state with the key already absorbed is kept and
+    copied per check. Without `client_token_key` the key is derived from
+    `secret_key`; changing the key revokes every token.
+    """
+
+    PREFIX = "v1."
+
+    def __init__(self, key: str, secret_key: str, required: bool) -> None:
+        if not key:
+            key = hmac.new(
+                secret_key.encode(), b"backchannel-client-token", hashlib.sha256
+            ).hexdigest()
+        self._mac = hmac.new(key.encode(), digestmod=hashlib.sha256)
+        self.required = required
+        self.rejected = 0
+
+    def issue(self, name: str) -> str:
+        mac = self._mac.copy()
+        mac.update(name.encode())
+        return self.PREFIX + base64.urlsafe_b64encode(mac.digest()).decode().rstrip("=")
+
+    def check(self, name: str, token: str | None) -> bool:
+        """Whether a client may act as `name`
+
+        A token that is sent has to match; sending one is only mandatory
+        with `client_token_required`.
+        """
+        if token is None:
+            allowed = not self.required
+        else:
+            allowed = hmac.compare_digest(self.issue(name).encode(), token.encode())
+        if not allowed:
+            self.rejected += 1
+        return allowed
+
+
+client_tokens = ClientTokenSigner(
+    settings.client_token_key, settings.secret_key, settings.client_token_required
+)
+password_verifier = PasswordVerifier(
+    settings.password_hash_workers, settings.password_hash_queue
 )
+login_throttle = LoginThrottle(settings.login_max_failures, settings.login_lockout)
 
 
 class User:
@@ -33,7 +245,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 @manager.user_loader()
-def load_user(username: str) -> Optional[User]:
+async def load_user(username: str) -> Optional[User]:
     """Load user for authentication - only allow admin user"""
     if username == "admin":
         return User(username)
@@ -44,8 +256,8 @@ def verify_master_password(password: str) -> bool:
     return verify_password(password, settings.master_password_hash)
 
 
-def authenticate_user(password: str) -> Optional[User]:
-    if verify_master_password(password):
+async def authenticate_user(password: str) -> Optional[User]:
+    if await password_verifier.verify(password):
         return User("admin")
     return None
 
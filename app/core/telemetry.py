@@ -0,0 +1,201 @@
+import asyncio
+import time
+from bisect import bisect_left
+from typing import Iterable, Mapping
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+ROUTERS = ("client", "manage", "auth", "other")
+
+
+class Histogram:
+    """Fixed-bucket histogram
+
+    `observe` bumps one preallocated bucket counter; the counts are only
+    made cumulative when rendered.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels: str) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def render_histograms(
+    name: str, description: str, label: str, histograms: Mapping[str, Histogram]
+) -> Iterable[str]:
+    yield f"# HELP {name} {description}"
+    yield f"# TYPE {name} histogram"
+    for value, histogram in histograms.items():
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            bucket = _labels(**{label: value, "le": str(bound)})
+            yield f"{name}_bucket{bucket} {cumulative}"
+        bucket = _labels(**{label: value, "le": "+Inf"})
+        yield f"{name}_bucket{bucket} {histogram.count}"
+        yield f"{name}_sum{_labels(**{label: value})} {histogram.sum}"
+        yield f"{name}_count{_labels(**{label: value})} {histogram.count}"
+
+
+def render_value(
+    name: str,
+    description: str,
+    kind: str,
+    value: float | Mapping[str, float],
+    label: str = "",
+) -> Iterable[str]:
+    """Render a gauge or counter, with one sample per label value for a mapping"""
+    yield f"# HELP {name} {description}"
+    yield f"# TYPE {name} {kind}"
+    if isinstance(value, Mapping):
+        for label_value, sample in value.items():
+            yield f"{name}{_labels(**{label: label_value})} {sample}"
+    else:
+        yield f"{name} {value}"
+
+
+class Telemetry:
+    """Timings collected by the server about itself
+
+    Gauges of the services (forwarders, port pool, ...) are read when
+    `/metrics` is scraped; only the timings below are recorded as they
+    happen. The event loop lag is the delay of a periodic sleep beyond
+    its interval.
+    """
+
+    def __init__(self, lag_interval: float = settings.loop_lag_interval) -> None:
+        self.request_seconds = {router: Histogram() for router in ROUTERS}
+        self.db_checkout_seconds = {pool: Histogram() for pool in ("read", "write")}
+        self.db_commit_seconds = {pool: Histogram() for pool in ("read", "write")}
+        self.loop_lag_seconds = Histogram()
+        self.loop_lag = 0.0
+        self._lag_interval = lag_interval
+        self._task: asyncio.Task[None] | None = None
+
+    def render(self) -> Iterable[str]:
+        yield from render_histograms(
+            "backchannel_http_request_duration_seconds",
+            "Time until the response headers were sent, per router",
+            "router",
+            self.request_seconds,
+        )
+        yield from render_histograms(
+            "backchannel_db_checkout_seconds",
+            "Time a session waited for a pooled connection",
+            "pool",
+            self.db_checkout_seconds,
+        )
+        yield from render_histograms(
+            "backchannel_db_commit_seconds",
+            "Time to flush and commit a session",
+            "pool",
+            self.db_commit_seconds,
+        )
+        yield from render_histograms(
+            "backchannel_event_loop_lag_seconds",
+            "Delay of the event loop beyond a scheduled wakeup",
+            "loop",
+            {"main": self.loop_lag_seconds},
+        )
+        yield from render_value(
+            "backchannel_event_loop_lag_last_seconds",
+            "Most recent event loop lag",
+            "gauge",
+            self.loop_lag,
+        )
+
+    async def _watch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self._lag_interval)
+            self.loop_lag = max(loop.time() - started - self._lag_interval, 0.0)
+            self.loop_lag_seconds.observe(self.loop_lag)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._watch_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+telemetry = Telemetry()
+
+
+class RequestTimingMiddleware:
+    """Records the latency of every HTTP request in its router's histogram
+
+    Plain ASGI instead of `BaseHTTPMiddleware`, so timing a request costs
+    a prefix lookup and two clock reads. The time is taken when the
+    response headers go out, so long-lived event streams count their
+    time to first byte rather than their lifetime.
+    """
+
+    def __init__(self, app: ASGIApp, routers: Mapping[str, str]) -> None:
+        self.app = app
+        self._routers = tuple(
+            (prefix, telemetry.request_seconds[router])
+            for prefix, router in routers.items()
+        )
+        self._other = telemetry.request_seconds["other"]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        histogram = self._other
+        for prefix, router_histogram in self._routers:
+            if path.startswith(prefix):
+                histogram = router_histogram
+                break
+        started = time.perf_counter()
+
+        async def timed_send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                histogram.observe(time.perf_counter() - started)
+            await send(message)
+
+        await self.app(scope, receive, timed_send)
@@ -8,8 +8,17 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from app.core.config import settings
-from app.core.database import init_db
-from app.routers import auth, client, manage
+from app.core.database import close_db, init_db
+from app.core.responses import SchemaJSONResponse
+from app.core.telemetry import RequestTimingMiddleware, telemetry
+from app.routers import auth, client, manage, metrics
+from app.services.client_registry import client_registry
+from app.services.fleet_view import fleet_view
+from app.services.forwarder import forwarder_manager
+from app.services.forwarder_directory import forwarder_directory
+from app.services.metric_history import metric_history
+from app.services.metric_ingest import metric_ingestor
+from app.services.standby_pool import standby_pool
 
 templates = Jinja2Templates(directory="app/templates")
 
@@ -18,8 +27,24 @@ API_V1_PREFIX = "/api/v1"
 
 @asynccontextmanager
 async def lifespan(app_obj: FastAPI) -> AsyncGenerator[None, None]:
+    await telemetry.start()
     await init_db()
+    await client_registry.start()
+    await fleet_view.start()
+    await metric_history.start()
+    await metric_ingestor.start()
+    await forwarder_directory.start()
+    await standby_pool.start()
     yield
+    await forwarder_manager.stop()
+    await standby_pool.stop()
+    await forwarder_directory.stop()
+    await metric_ingestor.stop()
+    await metric_history.stop()
+    await fleet_view.stop()
+    await client_registry.stop()
+    await close_db()
+    await telemetry.stop()
 
 
 app = FastAPI(
@@ -27,6 +52,7 @@ app = FastAPI(
     description="BackChannel Server API",
     docs_url=None,
     redoc_url=None,
+    default_response_class=SchemaJSONResponse,
     lifespan=lifespan,
 )
 
@@ -38,9 +64,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    RequestTimingMiddleware,
+    routers={
+        f"{API_V1_PREFIX}{router.prefix}": router.prefix.strip("/")
+        for router in (client.router, manage.router, auth.router)
+    },
+)
+
 app.include_router(auth.router, prefix=API_V1_PREFIX)
 app.include_router(client.router, prefix=API_V1_PREFIX)
 app.include_router(manage.router, prefix=API_V1_PREFIX)
+app.include_router(metrics.router)
 app.mount("/assets", StaticFiles(directory="app/assets"), name="assets")
 
 
@@ -1,4 +1,6 @@
+from app.models.forwarder import ForwarderEvent, ForwarderRecord
 from app.models.metric import Metric
+from app.models.metric_sample import MetricSample
 from app.models.order import Order
 
-__all__ = ["Order", "Metric"]
+__all__ = ["Order", "Metric", "MetricSample", "ForwarderRecord", "ForwarderEvent"]
@@ -0,0 +1,28 @@
+# Mapped is subscriptable, astroid loses track of it depending on module order
+# pylint: disable=unsubscriptable-object
+from sqlalchemy import Boolean, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class ForwarderRecord(Base):
+    __tablename__ = "forwarder"
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    client_name: Mapped[str] = mapped_column(String(50))
+    owner: Mapped[str] = mapped_column(String(100))
+    source_port: Mapped[int] = mapped_column(Integer)
+    target_port: Mapped[int] = mapped_column(Integer)
+    multiplex: Mapped[bool] = mapped_column(Boolean, default=False)
+    heartbeat_time: Mapped[int] = mapped_column(Integer)
+    finished: Mapped[bool] = mapped_column(Boolean, default=False)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class ForwarderEvent(Base):
+    __tablename__ = "forwarder_event"
+
+    forwarder_id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    event_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    data: Mapped[str] = mapped_column(Text)
@@ -0,0 +1,31 @@
+from typing import Optional
+
+from sqlalchemy import Float, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class MetricSample(Base):
+    __tablename__ = "metric_sample"
+    # One row per bucket, also the conflict target of the rollup upsert
+    __table_args__ = (
+        Index(
+            "ix_metric_sample_bucket", "name", "resolution", "timestamp", unique=True
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # Not a foreign key: history outlives the order row, which is deleted
+    # whenever a tunnel to the client closes.
+    name: Mapped[str] = mapped_column(String(50))
+    resolution: Mapped[int] = mapped_column(Integer)
+    timestamp: Mapped[int] = mapped_column(Integer)
+    samples: Mapped[int] = mapped_column(Integer, default=1)
+    uptime: Mapped[Optional[float]] = mapped_column(Float)
+    cpu_usage: Mapped[Optional[float]] = mapped_column(Float)
+    memory_usage: Mapped[Optional[float]] = mapped_column(Float)
+    disk_usage: Mapped[Optional[float]] = mapped_column(Float)
+    temperature: Mapped[Optional[float]] = mapped_column(Float)
+    cpu_usage_max: Mapped[Optional[float]] = mapped_column(Float)
+    temperature_max: Mapped[Optional[float]] = mapped_column(Float)
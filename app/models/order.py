@@ -1,3 +1,5 @@
+# Mapped is subscriptable, astroid loses track of it depending on module order
+# pylint: disable=unsubscriptable-object
 from typing import TYPE_CHECKING, Optional
 
 from sqlalchemy import Integer, String
@@ -16,6 +18,7 @@ class Order(Base):
     username: Mapped[Optional[str]] = mapped_column(String(50))
     port: Mapped[Optional[int]] = mapped_column(Integer)
     polled_time: Mapped[Optional[int]] = mapped_column(Integer)
+    status: Mapped[Optional[str]] = mapped_column(String(10))
     metric: Mapped["Metric"] = relationship(
         back_populates="order", cascade="all, delete-orphan"
     )
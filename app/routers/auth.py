@@ -1,21 +1,48 @@
-from fastapi import APIRouter, HTTPException, Response, status
+import math
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse
 
 from app.core.config import settings
-from app.core.security import authenticate_user, create_access_token
+from app.core.security import (
+    LoginBusyError,
+    authenticate_user,
+    create_access_token,
+    login_throttle,
+)
 from app.schemas.user import LoginRequest, LoginResponse
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 
 @router.post("/login", response_model=LoginResponse)
-def login(login_data: LoginRequest, response: Response) -> LoginResponse:
+async def login(
+    login_data: LoginRequest, request: Request, response: Response
+) -> LoginResponse:
     """Login with master password using LoginManager"""
-    user = authenticate_user(login_data.password)
+    address = request.client.host if request.client else ""
+    retry_after = login_throttle.retry_after(address)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed logins, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    try:
+        user = await authenticate_user(login_data.password)
+    except LoginBusyError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": "1"},
+        ) from exc
     if not user:
+        login_throttle.failure(address)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect password"
         )
+    login_throttle.success(address)
 
     # Create access token using LoginManager
     access_token = create_access_token(user.username)
@@ -1,67 +1,135 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 
-from app.core.database import get_db_session
-from app.models.metric import Metric
-from app.models.order import Order
+from app.core.config import settings
+from app.core.security import client_tokens
 from app.schemas.client import MetricData, MetricResponse, OrderResponse
-from app.utils.time_utils import get_time
+from app.services.client_channels import client_channels
+from app.services.client_registry import client_registry
+from app.services.fleet_view import fleet_view
+from app.services.metric_history import metric_history
+from app.services.metric_ingest import MetricQueueFullError, metric_ingestor
 
 router = APIRouter(prefix="/client", tags=["client"])
 
 
-@router.get("/order", response_model=OrderResponse)
-async def get_protected_data(
-    request: Request, db_session: AsyncSession = Depends(get_db_session)
-) -> OrderResponse:
-    name = request.headers.get("name")
-    username = request.headers.get("username")
+def client_name(request: Request) -> str:
+    """Name of the calling client, checked against its token
 
-    if not name:
+    Runs before the endpoint touches the registry, so unknown or forged
+    clients never get an entry (or a database row) created for them.
+    """
+    name = request.headers.get("name")
+    if not name or not client_tokens.check(name, request.headers.get("token")):
         raise HTTPException(status_code=401, detail="Authentication required")
+    return name
+
 
-    resp = OrderResponse()
+def record_metric(name: str, metric_data: MetricData) -> bool:
+    """Queue a metric sample, returns False if it was shed under load"""
+    metric_history.record(name, metric_data)
+    fleet_view.record_metric(name, metric_data)
+    try:
+        metric_ingestor.submit(name, metric_data)
+    except MetricQueueFullError:
+        return False
+    return True
+
+
+@router.get("/order", response_model=OrderResponse)
+async def get_protected_data(
+    request: Request,
+    name: str = Depends(client_name),
+    wait: float = Query(default=0, ge=0),
+) -> OrderResponse:
+    """Poll for a connect order
 
-    if order := await db_session.get(Order, name):
-        if order.port:
-            resp.port = order.port
-        order.polled_time = int(get_time())
-        order.username = username
-    else:
-        record = Order(name=name, polled_time=int(get_time()), username=username)
-        db_session.add(record)
-    await db_session.commit()
+    With `wait` the request is held for up to that many seconds (capped by
+    `long_poll_max_wait`) and answered as soon as a port is assigned.
+    """
+    client = client_registry.poll(name, request.headers.get("username"))
+    if client.port or not wait:
+        return OrderResponse(port=client.port or None, multiplex=client.multiplex)
 
-    return resp
+    port = await client_registry.wait_for_port(
+        name, min(wait, settings.long_poll_max_wait)
+    )
+    return OrderResponse(port=port or None, multiplex=client.multiplex)
 
 
 @router.put("/metric", response_model=MetricResponse)
 async def update_metric(
-    request: Request,
-    metric_data: MetricData,
-    db_session: AsyncSession = Depends(get_db_session),
+    metric_data: MetricData, name: str = Depends(client_name)
 ) -> MetricResponse:
-    name = request.headers.get("name")
-    order = await db_session.get(Order, name)
-    if name is None or order is None:
+    if await client_registry.adopt(name) is None:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    metric_query = select(Metric).where(Metric.name == name)
-    result = await db_session.execute(metric_query)
-    metric = result.scalar_one_or_none()
+    if not record_metric(name, metric_data):
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, retry later",
+            headers={"Retry-After": str(int(settings.metric_flush_interval) + 1)},
+        )
 
-    if metric is None:
-        metric = Metric()
-        metric.name = name
-        db_session.add(metric)
+    return MetricResponse(message="Metric updated successfully")
 
-    metric.cpu_usage = int(metric_data.cpu_usage)
-    metric.memory_usage = int(metric_data.memory_usage)
-    metric.disk_usage = int(metric_data.disk_usage)
-    metric.temperature = int(metric_data.temperature)
-    metric.uptime = int(metric_data.uptime)
 
-    await db_session.commit()
+@router.post("/heartbeat", response_model=OrderResponse)
+async def heartbeat(
+    request: Request, metric_data: MetricData, name: str = Depends(client_name)
+) -> OrderResponse:
+    """Order poll and metric upload in one request
 
-    return MetricResponse(message="Metric updated successfully")
+    A shed metric sample is not an error here: the order is still returned
+    and the next heartbeat carries a fresh sample.
+    """
+    client = client_registry.poll(name, request.headers.get("username"))
+    record_metric(name, metric_data)
+    return OrderResponse(port=client.port or None, multiplex=client.multiplex)
+
+
+@router.websocket("/ws")
+async def control_channel(websocket: WebSocket) -> None:
+    """Persistent channel replacing the order/metric polling
+
+    The client sends `{"type": "heartbeat", "metric": {...}}` or
+    `{"type": "pong"}` and receives `{"type": "order", "port": N}` as soon as
+    a connection is initiated (with `"multiplex": true` when the back-connection
+    carries multiplexed streams), plus `{"type": "ping"}` when it is quiet.
+    """
+    name = websocket.headers.get("name")
+    username = websocket.headers.get("username")
+
+    if not name or not client_tokens.check(name, websocket.headers.get("token")):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    async with client_channels.connect(websocket, name, username) as channel:
+        try:
+            while True:
+                try:
+                    message = await websocket.receive_json()
+                except (ValueError, KeyError):
+                    # KeyError: a binary frame has no "text"
+                    channel.push({"type": "error", "detail": "Invalid message"})
+                    continue
+                channel.seen()
+                if not isinstance(message, dict) or message.get("type") != "heartbeat":
+                    continue
+                try:
+                    metric_data = MetricData.model_validate(message.get("metric"))
+                except ValueError:
+                    channel.push({"type": "error", "detail": "Invalid metric"})
+                    continue
+                record_metric(name, metric_data)
+        except WebSocketDisconnect:
+            pass
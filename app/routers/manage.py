@@ -1,64 +1,244 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
-from fastapi.responses import JSONResponse, StreamingResponse
-from sqlalchemy import select
+import hashlib
+from typing import Annotated, Any, AsyncGenerator
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic_core import to_json
+from sqlalchemy import Select, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
 
+from app.core.config import settings
 from app.core.database import get_db_session
-from app.core.security import User, manager
+from app.core.security import User, client_tokens, manager
 from app.models.metric import Metric
 from app.models.order import Order
 from app.schemas.manage import (
+    ManageClientTokenData,
+    ManageClientTokenResponse,
     ManageConnectData,
     ManageConnectResponse,
+    ManageDataQuery,
     ManageDataResponse,
     ManageDataResponseItem,
     ManageDeleteData,
     ManageDeleteDataResponse,
+    ManageIngestResponse,
+    ManageMetricPoint,
+    ManageMetricsQuery,
+    ManageMetricsResponse,
+    ManagePortPoolResponse,
+    ManageStandbyResponse,
 )
-from app.services.forwarder import forwarder_manager
+from app.services.client_registry import client_registry
+from app.services.events import format_event
+from app.services.fleet_view import fleet_view
+from app.services.forwarder import ForwarderLimitError, forwarder_manager
+from app.services.forwarder_directory import forwarder_directory
+from app.services.metric_history import RESOLUTIONS, metric_history
+from app.services.metric_ingest import metric_ingestor
+from app.services.port_pool import PortPoolExhaustedError, port_pool
+from app.services.standby_pool import standby_pool
+from app.services.tunnel_policy import TunnelPolicy
+from app.utils.time_utils import get_time
 
 router = APIRouter(prefix="/manage", tags=["manage"])
 
 
+SORT_COLUMNS: dict[str, InstrumentedAttribute] = {
+    "name": Order.name,
+    "polledTime": Order.polled_time,
+    "uptime": Metric.uptime,
+    "cpuUsage": Metric.cpu_usage,
+    "memoryUsage": Metric.memory_usage,
+    "diskUsage": Metric.disk_usage,
+    "temperature": Metric.temperature,
+}
+
+
+# The columns of a `/data` row, in the field order of ManageDataResponseItem
+DATA_COLUMNS: tuple[InstrumentedAttribute, ...] = (
+    Order.name,
+    Order.polled_time,
+    Order.status,
+    Metric.uptime,
+    Metric.cpu_usage,
+    Metric.memory_usage,
+    Metric.disk_usage,
+    Metric.temperature,
+)
+DATA_KEYS = ManageDataResponseItem.field_aliases()
+
+
+def build_orders_query(params: ManageDataQuery) -> Select:
+    total = func.count().over().label("total")  # pylint: disable=not-callable
+    query = select(*DATA_COLUMNS, total).outerjoin(Order.metric)
+    if params.name_prefix:
+        query = query.where(Order.name.startswith(params.name_prefix, autoescape=True))
+    if params.stale_since is not None:
+        query = query.where(
+            or_(Order.polled_time.is_(None), Order.polled_time < params.stale_since)
+        )
+    if params.has_open_port is not None:
+        query = query.where(
+            Order.port.is_not(None) if params.has_open_port else Order.port.is_(None)
+        )
+    if params.status is not None:
+        query = query.where(Order.status == params.status)
+
+    sort_column = SORT_COLUMNS[params.sort]
+    if params.order == "desc":
+        query = query.order_by(sort_column.desc().nulls_last(), Order.name)
+    else:
+        query = query.order_by(sort_column.asc().nulls_last(), Order.name)
+    return query.offset(params.offset).limit(params.limit)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
 @router.get("/data", response_model=ManageDataResponse)
 async def get_all_orders(
-    _: User = Depends(manager), db_session: AsyncSession = Depends(get_db_session)
-) -> JSONResponse:
-    resp = ManageDataResponse()
-
-    orders_result = await db_session.execute(select(Order).order_by(Order.name))
-    orders = orders_result.scalars().all()
-    for order in sorted(orders, key=lambda o: o.name):
-        resp_item = ManageDataResponseItem(
-            name=order.name,
-            polled_time=float(order.polled_time)
-            if order.polled_time is not None
-            else 0.0,
+    request: Request,
+    params: Annotated[ManageDataQuery, Query()],
+    _: User = Depends(manager),
+    db_session: AsyncSession = Depends(get_db_session),
+) -> Response:
+    """One page of clients with their latest metrics
+
+    The rows are encoded straight from the selected columns in one pass,
+    without building a ManageDataResponseItem per client. The response
+    carries an ETag of its body; a dashboard sending it back in
+    `If-None-Match` gets an empty 304 while nothing changed.
+    """
+    items: list[dict[str, Any]] = []
+    total = 0
+
+    result = await db_session.execute(build_orders_query(params))
+    for *values, total in result:
+        item = dict(zip(DATA_KEYS, values))
+        item["polledTime"] = float(item["polledTime"] or 0)
+        items.append(item)
+
+    if not items and params.offset:
+        # The window count is only available when the page has rows
+        count_query = build_orders_query(params).offset(None).limit(None)
+        count_result = await db_session.execute(
+            select(func.count()).select_from(  # pylint: disable=not-callable
+                count_query.order_by(None).subquery()
+            )
         )
-        metric_result = await db_session.execute(
-            select(Metric).where(Metric.name == order.name)
+        total = count_result.scalar_one()
+
+    response = Response(
+        to_json({"data": items, "total": total}),
+        media_type="application/json",
+        headers={"Cache-Control": "no-cache"},
+    )
+    etag = f'"{hashlib.blake2b(response.body, digest_size=16).hexdigest()}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={"ETag": etag, "Cache-Control": "no-cache"},
         )
-        if metric := metric_result.scalars().first():
-            resp_item.uptime = metric.uptime
-            resp_item.cpu_usage = metric.cpu_usage
-            resp_item.memory_usage = metric.memory_usage
-            resp_item.disk_usage = metric.disk_usage
-            resp_item.temperature = metric.temperature
-        resp.data.append(resp_item)
+    response.headers["ETag"] = etag
+    return response
+
+
+@router.get("/stream")
+async def fleet_stream(
+    _: User = Depends(manager),
+    last_event_id: int | None = Header(default=None),
+) -> StreamingResponse:
+    """The clients of `/data` as a snapshot followed by deltas
+
+    The first event is `{"type": "snapshot", "clients": [...]}` with every
+    client row, ordered by name. After it come `{"type": "delta", "clients": [...],
+    "removed": [...]}` events, at most one per `fleet_stream_interval`,
+    listing only the changed fields of each changed client (new clients
+    with all fields) and the names of deleted clients.
+
+    With the database forwarder directory each worker only tracks the
+    clients polling it, so the stream does not exist and the dashboard
+    polls `/data` instead.
+    """
+    if settings.forwarder_directory == "database":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return StreamingResponse(
+        fleet_view.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
 
-    return JSONResponse(resp.model_dump())
+
+@router.get("/clients/events")
+async def client_status_events(
+    _: User = Depends(manager),
+    last_event_id: int | None = Header(default=None),
+) -> StreamingResponse:
+    """Stream of client status transitions
+
+    Every event is a JSON object with the client `name`, its new `status`
+    (`online`, `stale` or `offline`), the `previous` status and the `time`
+    of the transition. Each worker streams the transitions it observed.
+    """
+
+    async def responses() -> AsyncGenerator[str, None]:
+        async for event in client_registry.events.subscribe(last_event_id):
+            yield format_event(event.id, event.data)
+
+    return StreamingResponse(
+        responses(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.get("/metrics/{name}", response_model=ManageMetricsResponse)
+async def get_metric_history(
+    name: str,
+    params: Annotated[ManageMetricsQuery, Query()],
+    _: User = Depends(manager),
+) -> ManageMetricsResponse:
+    end = params.end if params.end is not None else int(get_time())
+    start = params.start if params.start is not None else end - 60 * 60
+    points = await metric_history.query(
+        name, RESOLUTIONS[params.resolution], start, end
+    )
+    return ManageMetricsResponse(
+        name=name,
+        resolution=params.resolution,
+        points=[ManageMetricPoint(**point._asdict()) for point in points],
+    )
 
 
 @router.delete("/data", response_model=ManageDeleteDataResponse)
 async def delete_order_data(
     data: ManageDeleteData,
     _: User = Depends(manager),
-    db_session: AsyncSession = Depends(get_db_session),
 ) -> ManageDeleteDataResponse:
-    order = await db_session.get(Order, data.name)
-    if order:
-        await db_session.delete(order)
-        await db_session.commit()
+    if await client_registry.delete(data.name):
         return ManageDeleteDataResponse(
             message=f"Data for '{data.name}' deleted successfully"
         )
@@ -69,27 +249,54 @@ async def delete_order_data(
 @router.post("/connect")
 async def initiate_connection(
     body: ManageConnectData,
-    background_tasks: BackgroundTasks,
     _: User = Depends(manager),
 ) -> ManageConnectResponse:
-    forwarder_id, forwarder_start = await forwarder_manager.create_forwarder(body.name)
-    background_tasks.add_task(
-        forwarder_start, forwarder_id, forwarder_manager.forwarders
+    policy = TunnelPolicy(
+        **body.model_dump_snake_case(exclude={"name", "multiplex"}, exclude_none=True)
     )
+    try:
+        forwarder_id = await forwarder_manager.create_forwarder(
+            body.name, policy=policy, multiplex=body.multiplex
+        )
+    except (PortPoolExhaustedError, ForwarderLimitError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc)
+        ) from exc
+    if forwarder := forwarder_manager.get_forwarder(forwarder_id):
+        await forwarder_directory.register(forwarder_id, forwarder)
     return ManageConnectResponse(forwarder_id=forwarder_id)
 
 
+@router.post("/token", response_model=ManageClientTokenResponse)
+async def issue_client_token(
+    body: ManageClientTokenData,
+    _: User = Depends(manager),
+) -> ManageClientTokenResponse:
+    """Token the named client sends in its `token` header
+
+    The token is derived from the name, so issuing it again returns the
+    same token and nothing is stored.
+    """
+    return ManageClientTokenResponse(
+        name=body.name,
+        token=client_tokens.issue(body.name),
+        required=client_tokens.required,
+    )
+
+
 @router.get("/forwarder/{forwarder_id}")
 async def forwarder_status(
-    forwarder_id: str, _: User = Depends(manager)
+    forwarder_id: str,
+    _: User = Depends(manager),
+    last_event_id: int | None = Header(default=None),
 ) -> StreamingResponse:
-    if not forwarder_manager.is_forwarder_running(forwarder_id):
+    if not await forwarder_directory.is_running(forwarder_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Forwarder not found"
         )
 
     return StreamingResponse(
-        forwarder_manager.get_forwarder_responses(forwarder_id),
+        forwarder_directory.get_responses(forwarder_id, last_event_id),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -103,8 +310,52 @@ async def forwarder_status(
 async def cancel_forward_job(
     forwarder_id: str, _: User = Depends(manager)
 ) -> ManageDeleteDataResponse:
-    if forwarder_manager.cancel_forwarder(forwarder_id):
+    if await forwarder_directory.cancel(forwarder_id):
         return ManageDeleteDataResponse(message="Forwarder cancelled successfully")
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND, detail="Forwarder not found"
     )
+
+
+@router.get("/ports", response_model=ManagePortPoolResponse)
+async def port_pool_status(_: User = Depends(manager)) -> ManagePortPoolResponse:
+    return ManagePortPoolResponse(
+        size=port_pool.size,
+        leased=port_pool.leased,
+        available=port_pool.available,
+        utilization=port_pool.leased / port_pool.size if port_pool.size else 0.0,
+        bind_failures=port_pool.bind_failures,
+        exhausted=port_pool.exhausted,
+        forwarders=len(forwarder_manager.forwarders),
+        max_forwarders=forwarder_manager.max_forwarders,
+    )
+
+
+@router.get("/standby", response_model=ManageStandbyResponse)
+async def standby_pool_status(_: User = Depends(manager)) -> ManageStandbyResponse:
+    claims = standby_pool.hits + standby_pool.misses
+    return ManageStandbyResponse(
+        enabled=standby_pool.enabled,
+        parked=standby_pool.parked,
+        clients=standby_pool.clients,
+        hits=standby_pool.hits,
+        misses=standby_pool.misses,
+        hit_rate=standby_pool.hits / claims if claims else 0.0,
+        rejected=standby_pool.rejected,
+        recycled=standby_pool.recycled,
+        expired=standby_pool.expired,
+    )
+
+
+@router.get("/ingest", response_model=ManageIngestResponse)
+async def metric_ingest_status(_: User = Depends(manager)) -> ManageIngestResponse:
+    return ManageIngestResponse(
+        queue_depth=metric_ingestor.queue_depth,
+        queue_size=metric_ingestor.queue_size,
+        accepted=metric_ingestor.accepted,
+        shed=metric_ingestor.shed,
+        flushed=metric_ingestor.flushed,
+        last_batch_size=metric_ingestor.last_batch_size,
+        last_flush_seconds=metric_ingestor.last_flush_seconds,
+        max_flush_seconds=metric_ingestor.max_flush_seconds,
+    )
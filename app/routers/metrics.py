@@ -0,0 +1,163 @@
+import hmac
+from typing import Iterable
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.security import (
+    client_tokens,
+    login_throttle,
+    manager,
+    password_verifier,
+)
+from app.core.telemetry import render_value, telemetry
+from app.services.client_channels import client_channels
+from app.services.client_registry import client_registry
+from app.services.fleet_view import fleet_view
+from app.services.forwarder import forwarder_manager
+from app.services.forwarder_directory import forwarder_directory
+from app.services.metric_ingest import metric_ingestor
+from app.services.port_pool import port_pool
+from app.services.standby_pool import standby_pool
+
+router = APIRouter(tags=["metrics"])
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _service_samples() -> Iterable[str]:
+    yield from render_value(
+        "backchannel_forwarders",
+        "Forwarders running in this worker",
+        "gauge",
+        len(forwarder_manager.forwarders),
+    )
+    yield from render_value(
+        "backchannel_forwarders_max",
+        "Forwarders allowed to run at once",
+        "gauge",
+        forwarder_manager.max_forwarders,
+    )
+    yield from render_value(
+        "backchannel_port_pool_size", "Ports in the range", "gauge", port_pool.size
+    )
+    yield from render_value(
+        "backchannel_port_pool_leased", "Ports in use", "gauge", port_pool.leased
+    )
+    yield from render_value(
+        "backchannel_port_pool_bind_failures_total",
+        "Ports that could not be bound",
+        "counter",
+        port_pool.bind_failures,
+    )
+    yield from render_value(
+        "backchannel_port_pool_exhausted_total",
+        "Leases that found no free port",
+        "counter",
+        port_pool.exhausted,
+    )
+    yield from render_value(
+        "backchannel_relay_bytes_total",
+        "Bytes relayed by tunnels, use rate() for bytes per second",
+        "counter",
+        forwarder_manager.relayed_bytes(),
+        label="direction",
+    )
+    yield from render_value(
+        "backchannel_sse_subscribers",
+        "Open forwarder status streams",
+        "gauge",
+        forwarder_manager.subscribers + forwarder_directory.remote_subscribers,
+    )
+    yield from render_value(
+        "backchannel_dashboard_streams",
+        "Open fleet and client status streams",
+        "gauge",
+        fleet_view.events.subscribers + client_registry.events.subscribers,
+    )
+    yield from render_value(
+        "backchannel_clients",
+        "Clients known to the registry",
+        "gauge",
+        len(client_registry),
+    )
+    yield from render_value(
+        "backchannel_clients_by_status",
+        "Clients per liveness status",
+        "gauge",
+        client_registry.liveness.counts(),
+        label="status",
+    )
+    yield from render_value(
+        "backchannel_client_long_polls",
+        "Parked long-poll requests",
+        "gauge",
+        client_registry.parked,
+    )
+    yield from render_value(
+        "backchannel_client_channels",
+        "Open client WebSocket channels",
+        "gauge",
+        len(client_channels),
+    )
+    yield from render_value(
+        "backchannel_metric_queue_depth",
+        "Metric uploads waiting to be written",
+        "gauge",
+        metric_ingestor.queue_depth,
+    )
+    yield from render_value(
+        "backchannel_standby_connections",
+        "Parked standby connections",
+        "gauge",
+        standby_pool.parked,
+    )
+    yield from render_value(
+        "backchannel_standby_claims_total",
+        "Connect requests by standby outcome",
+        "counter",
+        {"hit": standby_pool.hits, "miss": standby_pool.misses},
+        label="result",
+    )
+    yield from render_value(
+        "backchannel_auth_token_cache_total",
+        "Session token checks by verified-token cache outcome",
+        "counter",
+        {"hit": manager.token_cache.hits, "miss": manager.token_cache.misses},
+        label="result",
+    )
+    yield from render_value(
+        "backchannel_login_rejected_total",
+        "Logins refused before checking the password",
+        "counter",
+        {"throttled": login_throttle.rejected, "busy": password_verifier.rejected},
+        label="reason",
+    )
+    yield from render_value(
+        "backchannel_client_auth_rejected_total",
+        "Client requests refused for a missing or forged token",
+        "counter",
+        client_tokens.rejected,
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request) -> PlainTextResponse:
+    """Server metrics in the Prometheus text exposition format
+
+    Each worker reports its own numbers. The scraper has to send
+    `metrics_token` as a bearer token; without a token configured the
+    endpoint does not exist.
+    """
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    expected = f"Bearer {settings.metrics_token}"
+    authorization = request.headers.get("authorization", "")
+    if not hmac.compare_digest(authorization.encode(), expected.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
+        )
+
+    lines = [*telemetry.render(), *_service_samples()]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=CONTENT_TYPE)
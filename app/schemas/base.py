@@ -14,5 +14,13 @@ class BaseSchema(BaseModel):
     def model_dump(self, **kwargs: Any) -> dict[str, Any]:
         return super().model_dump(by_alias=True, **kwargs)
 
+    def model_dump_json(self, **kwargs: Any) -> str:
+        return super().model_dump_json(by_alias=True, **kwargs)
+
+    @classmethod
+    def field_aliases(cls) -> tuple[str, ...]:
+        """The JSON keys of the fields, in declaration order"""
+        return tuple(field.alias or name for name, field in cls.model_fields.items())
+
     def model_dump_snake_case(self, **kwargs: Any) -> dict[str, Any]:
         return super().model_dump(by_alias=False, **kwargs)
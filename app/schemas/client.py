@@ -3,6 +3,7 @@ from app.schemas.base import BaseSchema
 
 class OrderResponse(BaseSchema):
     port: int | None = None
+    multiplex: bool = False
 
 
 class MetricData(BaseSchema):
@@ -1,9 +1,34 @@
+from typing import Literal
+
+from pydantic import Field
+
 from app.schemas.base import BaseSchema
+from app.schemas.client import MetricData
+
+
+class ManageDataQuery(BaseSchema):
+    offset: int = Field(default=0, ge=0)
+    limit: int | None = Field(default=None, ge=1)
+    name_prefix: str | None = None
+    stale_since: int | None = None
+    has_open_port: bool | None = None
+    status: Literal["online", "stale", "offline"] | None = None
+    sort: Literal[
+        "name",
+        "polledTime",
+        "uptime",
+        "cpuUsage",
+        "memoryUsage",
+        "diskUsage",
+        "temperature",
+    ] = "name"
+    order: Literal["asc", "desc"] = "asc"
 
 
 class ManageDataResponseItem(BaseSchema):
     name: str
     polled_time: float
+    status: str | None = None
     uptime: int | None = None
     cpu_usage: int | None = None
     memory_usage: int | None = None
@@ -13,6 +38,7 @@ class ManageDataResponseItem(BaseSchema):
 
 class ManageDataResponse(BaseSchema):
     data: list[ManageDataResponseItem] = []
+    total: int = 0
 
 
 class ManageDeleteData(BaseSchema):
@@ -25,7 +51,74 @@ class ManageDeleteDataResponse(BaseSchema):
 
 class ManageConnectData(BaseSchema):
     name: str
+    multiplex: bool = False
+    idle_timeout: float | None = Field(default=None, ge=0)
+    max_lifetime: float | None = Field(default=None, ge=0)
+    bandwidth_limit: int | None = Field(default=None, ge=0)
 
 
 class ManageConnectResponse(BaseSchema):
     forwarder_id: str
+
+
+class ManageClientTokenData(BaseSchema):
+    name: str = Field(min_length=1)
+
+
+class ManageClientTokenResponse(BaseSchema):
+    name: str
+    token: str
+    required: bool
+
+
+class ManagePortPoolResponse(BaseSchema):
+    size: int
+    leased: int
+    available: int
+    utilization: float
+    bind_failures: int
+    exhausted: int
+    forwarders: int
+    max_forwarders: int
+
+
+class ManageStandbyResponse(BaseSchema):
+    enabled: bool
+    parked: int
+    clients: int
+    hits: int
+    misses: int
+    hit_rate: float
+    rejected: int
+    recycled: int
+    expired: int
+
+
+class ManageMetricsQuery(BaseSchema):
+    start: int | None = None
+    end: int | None = None
+    resolution: Literal["raw", "1m", "1h"] = "raw"
+
+
+class ManageMetricPoint(MetricData):
+    timestamp: int
+    samples: int
+    cpu_usage_max: float
+    temperature_max: float
+
+
+class ManageMetricsResponse(BaseSchema):
+    name: str
+    resolution: str
+    points: list[ManageMetricPoint] = []
+
+
+class ManageIngestResponse(BaseSchema):
+    queue_depth: int
+    queue_size: int
+    accepted: int
+    shed: int
+    flushed: int
+    last_batch_size: int
+    last_flush_seconds: float
+    max_flush_seconds: float
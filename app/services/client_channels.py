@@ -0,0 +1,122 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator
+
+from fastapi import WebSocket, status
+
+from app.core.config import settings
+from app.services.client_registry import client_registry
+from app.utils.logger import logger
+
+
+class ClientChannel:
+    """One connected client: pushes queued messages and keeps it alive
+
+    Messages pushed from anywhere are queued and written by the channel's
+    sender task. When the client has been quiet for `client_ws_ping_interval`
+    the sender pings it, and after `client_ws_timeout` without any message
+    the connection is closed. The registry `polled_time` is refreshed at
+    most once per `client_ws_touch_interval`, not on every message.
+    """
+
+    def __init__(self, websocket: WebSocket, name: str, username: str | None) -> None:
+        self.websocket = websocket
+        self.name = name
+        self.username = username
+        self._outbox: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._last_seen = time.monotonic()
+        self._last_touch = self._last_seen
+
+    def push(self, message: dict[str, Any]) -> None:
+        self._outbox.put_nowait(message)
+
+    def seen(self) -> None:
+        """Record a message from the client"""
+        self._last_seen = now = time.monotonic()
+        if now - self._last_touch >= settings.client_ws_touch_interval:
+            self._last_touch = now
+            client_registry.poll(self.name, self.username)
+
+    async def close(self, reason: str) -> None:
+        try:
+            await self.websocket.close(
+                code=status.WS_1000_NORMAL_CLOSURE, reason=reason
+            )
+        except RuntimeError:
+            # Already closed by the client
+            pass
+
+    async def send_loop(self) -> None:
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    self._outbox.get(), settings.client_ws_ping_interval
+                )
+            except asyncio.TimeoutError:
+                idle = time.monotonic() - self._last_seen
+                if idle >= settings.client_ws_timeout:
+                    logger.info("Client channel %s timed out", self.name)
+                    await self.close("Liveness timeout")
+                    return
+                if idle < settings.client_ws_ping_interval:
+                    continue
+                message = {"type": "ping"}
+            await self.websocket.send_json(message)
+
+
+class ClientChannels:
+    """Registry of the open client WebSocket channels, keyed by client name
+
+    Connect orders are pushed to the channel as soon as the client gets a
+    port. Clients without a channel keep using the polling endpoints.
+    """
+
+    def __init__(self) -> None:
+        self._channels: dict[str, ClientChannel] = {}
+        client_registry.add_port_listener(self.push_order)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._channels
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def push_order(self, name: str, port: int) -> None:
+        if (channel := self._channels.get(name)) and (
+            client := client_registry.get(name)
+        ):
+            channel.push({"type": "order", "port": port, "multiplex": client.multiplex})
+
+    @asynccontextmanager
+    async def connect(
+        self, websocket: WebSocket, name: str, username: str | None
+    ) -> AsyncGenerator[ClientChannel, None]:
+        channel = ClientChannel(websocket, name, username)
+        if previous := self._channels.get(name):
+            await previous.close("Replaced by a new connection")
+        self._channels[name] = channel
+
+        client = client_registry.poll(name, username)
+        if client.port:
+            channel.push(
+                {"type": "order", "port": client.port, "multiplex": client.multiplex}
+            )
+
+        sender = asyncio.create_task(channel.send_loop())
+        try:
+            yield channel
+        finally:
+            sender.cancel()
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            except Exception:  # pylint: disable=broad-exception-caught
+                # The client went away in the middle of a send
+                pass
+            if self._channels.get(name) is channel:
+                del self._channels[name]
+
+
+client_channels = ClientChannels()
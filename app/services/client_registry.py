@@ -0,0 +1,316 @@
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import open_db_session, open_write_session, upsert
+from app.models.order import Order
+from app.services.events import EventBus
+from app.services.liveness import ClientStatus, LivenessTracker
+from app.utils.logger import logger
+from app.utils.time_utils import get_time
+
+PortListener = Callable[[str, int], None]
+ChangeListener = Callable[[str], None]
+
+
+class _PortWaiter:
+    __slots__ = ("event", "parked")
+
+    def __init__(self) -> None:
+        self.event = asyncio.Event()
+        self.parked = 0
+
+
+@dataclass(slots=True)
+class ClientState:
+    name: str
+    username: str | None = None
+    port: int | None = None
+    polled_time: int | None = None
+    multiplex: bool = False
+
+
+class ClientRegistry:
+    """In-memory view of the `order` table used by the client endpoints
+
+    Polls are answered from memory and only mark the client dirty; a
+    background task writes all dirty clients back in one transaction every
+    `client_flush_interval` seconds, and once more on shutdown.
+
+    Long-polling clients park on a per-client event that `set_port` fires,
+    so a connect order reaches them as soon as the forwarder is listening.
+    Port listeners get the same notification for pushed channels.
+
+    Heartbeats also feed the liveness tracker; its online/stale/offline
+    transitions are written back with the next flush and published as
+    JSON on `events`.
+    """
+
+    def __init__(self, flush_interval: float = settings.client_flush_interval) -> None:
+        self._flush_interval = flush_interval
+        self._clients: dict[str, ClientState] = {}
+        self._dirty: set[str] = set()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._waiters: dict[str, _PortWaiter] = {}
+        self._port_listeners: list[PortListener] = []
+        self._change_listeners: list[ChangeListener] = []
+        self._shared_ports: dict[str, tuple[int, bool]] = {}
+        self.parked = 0
+        self.liveness = LivenessTracker()
+        self.liveness.add_listener(self._status_changed)
+        self.events = EventBus()
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, name: str) -> ClientState | None:
+        return self._clients.get(name)
+
+    def names(self) -> list[str]:
+        return list(self._clients)
+
+    def poll(self, name: str, username: str | None) -> ClientState:
+        """Record a heartbeat from a client, registering it if it is new"""
+        client = self._clients.get(name)
+        if client is None:
+            port, multiplex = self._shared_ports.get(name, (None, False))
+            client = self._clients[name] = ClientState(
+                name, port=port, multiplex=multiplex
+            )
+        now = get_time()
+        client.username = username
+        client.polled_time = int(now)
+        self._dirty.add(name)
+        self.liveness.touch(name, now)
+        for listener in self._change_listeners:
+            listener(name)
+        return client
+
+    def _status_changed(
+        self, name: str, status: ClientStatus, previous: ClientStatus | None
+    ) -> None:
+        self._dirty.add(name)
+        for listener in self._change_listeners:
+            listener(name)
+        self.events.publish(
+            json.dumps(
+                {
+                    "name": name,
+                    "status": status,
+                    "previous": previous,
+                    "time": int(get_time()),
+                }
+            )
+        )
+
+    def set_port(self, name: str, port: int | None, multiplex: bool = False) -> bool:
+        if client := self._clients.get(name):
+            client.port = port
+            client.multiplex = multiplex
+            self._dirty.add(name)
+            if port:
+                if waiter := self._waiters.get(name):
+                    waiter.event.set()
+                for listener in self._port_listeners:
+                    listener(name, port)
+            return True
+        return False
+
+    def sync_ports(self, ports: dict[str, tuple[int, bool]]) -> None:
+        """Apply the ports of forwarders that may run in other workers
+
+        `ports` maps client names to the target port and multiplex flag.
+        Clients polling this worker for the first time get their port from
+        here too. Ports that disappeared from `ports` are cleared.
+        """
+        for name, (port, multiplex) in ports.items():
+            client = self._clients.get(name)
+            if client and client.port != port:
+                self.set_port(name, port, multiplex)
+        for name, (port, _) in self._shared_ports.items():
+            client = self._clients.get(name)
+            if name not in ports and client and client.port == port:
+                self.set_port(name, None)
+        self._shared_ports = ports
+
+    def add_port_listener(self, listener: PortListener) -> None:
+        """Call `listener(name, port)` whenever a client gets a port"""
+        self._port_listeners.append(listener)
+
+    def add_change_listener(self, listener: ChangeListener) -> None:
+        """Call `listener(name)` when a client polls, changes status or is deleted"""
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener: ChangeListener) -> None:
+        self._change_listeners.remove(listener)
+
+    async def adopt(self, name: str) -> ClientState | None:
+        """The client, loaded from the database when this worker lacks it
+
+        With several workers a client may have polled another one, which
+        wrote its row. A client polling for the first time is only found
+        once that worker flushed.
+        """
+        if client := self._clients.get(name):
+            return client
+        db_session = await open_db_session()
+        try:
+            order = await db_session.get(Order, name)
+        finally:
+            await db_session.close()
+        if order is None:
+            return None
+        if client := self._clients.get(name):
+            # Polled this worker while the row was being read
+            return client
+        client = self._clients[name] = ClientState(
+            order.name, order.username, order.port, order.polled_time
+        )
+        if order.name in self._shared_ports:
+            client.port, client.multiplex = self._shared_ports[order.name]
+        self.liveness.restore(name, order.polled_time)
+        for listener in self._change_listeners:
+            listener(name)
+        return client
+
+    async def wait_for_port(self, name: str, timeout: float) -> int | None:
+        """Park until the client gets a port or the timeout expires
+
+        Returns right away when the client already has a port or when
+        `long_poll_max_parked` requests are already waiting.
+        """
+        client = self._clients.get(name)
+        if (
+            client is None
+            or client.port
+            or self.parked >= settings.long_poll_max_parked
+        ):
+            return client.port if client else None
+
+        waiter = self._waiters.get(name)
+        if waiter is None:
+            waiter = self._waiters[name] = _PortWaiter()
+        waiter.parked += 1
+        self.parked += 1
+        try:
+            await asyncio.wait_for(waiter.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiter.parked -= 1
+            self.parked -= 1
+            if not waiter.parked and self._waiters.get(name) is waiter:
+                del self._waiters[name]
+
+        client = self._clients.get(name)
+        return client.port if client else None
+
+    async def delete(self, name: str) -> bool:
+        """Forget a client and delete its row, returns False if it was unknown"""
+        async with self._lock:
+            found = self._clients.pop(name, None) is not None
+            self._dirty.discard(name)
+            self.liveness.forget(name)
+            for listener in self._change_listeners:
+                listener(name)
+            db_session = await open_write_session()
+            try:
+                if order := await db_session.get(Order, name):
+                    await db_session.delete(order)
+                    await db_session.commit()
+                    found = True
+            finally:
+                await db_session.close()
+        return found
+
+    async def load(self) -> None:
+        db_session = await open_db_session()
+        try:
+            result = await db_session.execute(select(Order))
+            orders = result.scalars().all()
+            self._clients = {
+                order.name: ClientState(
+                    order.name, order.username, order.port, order.polled_time
+                )
+                for order in orders
+            }
+            for order in orders:
+                if self.liveness.restore(order.name, order.polled_time) != order.status:
+                    self._dirty.add(order.name)
+        finally:
+            await db_session.close()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [
+                {
+                    "name": client.name,
+                    "username": client.username,
+                    "port": client.port,
+                    "polled_time": client.polled_time,
+                    "status": self.liveness.status(name),
+                }
+                for name in dirty
+                if (client := self._clients.get(name))
+            ]
+            if not rows:
+                return
+
+            stmt = upsert(Order)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Order.name],
+                set_={
+                    "username": stmt.excluded.username,
+                    "port": stmt.excluded.port,
+                    "polled_time": stmt.excluded.polled_time,
+                    "status": stmt.excluded.status,
+                },
+            )
+            db_session = await open_write_session()
+            try:
+                await db_session.execute(stmt, rows)
+                await db_session.commit()
+            except Exception:
+                self._dirty |= dirty
+                raise
+            finally:
+                await db_session.close()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to flush client registry")
+
+    async def start(self) -> None:
+        if self.events.closed:
+            self.events = EventBus()
+        await self.load()
+        await self.liveness.start()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.liveness.stop()
+        self.events.close()
+        await self.flush()
+
+
+client_registry = ClientRegistry()
@@ -0,0 +1,99 @@
+import asyncio
+from collections import deque
+from itertools import islice
+from typing import AsyncGenerator, NamedTuple
+
+from app.core.config import settings
+
+
+class Event(NamedTuple):
+    id: int
+    data: str
+    # "dropped" for the notice of events a subscriber missed
+    kind: str = "message"
+
+
+def format_event(event_id: int, data: str) -> str:
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+
+class EventBus:
+    """Bounded in-memory pub/sub log with numbered events
+
+    Publishing never blocks: when the buffer is full the oldest event is
+    dropped, and subscribers that fell behind it get a "dropped" event
+    telling how many they missed. Each subscriber keeps its own cursor, so
+    any number of them can read the same stream and resume from a
+    `Last-Event-ID`; an id the bus has not reached yet subscribes from the
+    start.
+    """
+
+    def __init__(self, maxlen: int = settings.event_buffer_size) -> None:
+        self._events: deque[Event] = deque(maxlen=maxlen)
+        self._next_id = 1
+        self._wakeup = asyncio.Event()
+        self._closed = False
+        self.subscribers = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def publish(self, data: str) -> None:
+        self._events.append(Event(self._next_id, data))
+        self._next_id += 1
+        self._notify()
+
+    def close(self) -> None:
+        self._closed = True
+        self._notify()
+
+    def covers(self, last_event_id: int) -> bool:
+        """Whether every event after `last_event_id` is still buffered"""
+        first_id = self._events[0].id if self._events else self._next_id
+        return first_id <= last_event_id + 1 and last_event_id <= self.last_id
+
+    def since(self, last_event_id: int) -> list[Event]:
+        """Buffered events after `last_event_id`, without waiting"""
+        first_id = self._events[0].id if self._events else self._next_id
+        return list(islice(self._events, max(last_event_id + 1 - first_id, 0), None))
+
+    def _notify(self) -> None:
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def subscribe(
+        self, last_event_id: int | None = None
+    ) -> AsyncGenerator[Event, None]:
+        cursor = last_event_id or 0
+        if cursor > self.last_id:
+            # An id from before a restart, numbering started over since
+            cursor = 0
+        self.subscribers += 1
+        try:
+            while True:
+                first_id = self._events[0].id if self._events else self._next_id
+                if cursor + 1 < first_id:
+                    yield Event(
+                        first_id - 1,
+                        f"{first_id - 1 - cursor} messages dropped",
+                        "dropped",
+                    )
+                    cursor = first_id - 1
+
+                pending = list(islice(self._events, cursor + 1 - first_id, None))
+                for event in pending:
+                    yield event
+                    cursor = event.id
+                if pending:
+                    continue
+
+                if self._closed:
+                    return
+                await self._wakeup.wait()
+        finally:
+            self.subscribers -= 1
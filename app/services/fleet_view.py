@@ -0,0 +1,163 @@
+import asyncio
+from typing import Any, AsyncGenerator
+
+from pydantic_core import to_json
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import open_db_session
+from app.models.metric import Metric
+from app.schemas.client import MetricData
+from app.services.client_registry import client_registry
+from app.services.events import EventBus, format_event
+from app.utils.logger import logger
+
+METRIC_FIELDS = {
+    "uptime": "uptime",
+    "cpu_usage": "cpuUsage",
+    "memory_usage": "memoryUsage",
+    "disk_usage": "diskUsage",
+    "temperature": "temperature",
+}
+
+
+class FleetView:
+    """The `/manage/data` rows of every client, kept current in memory
+
+    Heartbeats, status transitions and metric uploads only mark their
+    client dirty. Every `fleet_stream_interval` seconds the dirty rows are
+    rebuilt and compared with the previous ones, and the changed fields
+    of all of them are published as one delta on `events`. A dashboard
+    stream starts from a snapshot of the rows and then follows the
+    deltas, so an idle fleet costs it nothing.
+    """
+
+    def __init__(self, interval: float = settings.fleet_stream_interval) -> None:
+        self._interval = interval
+        self._rows: dict[str, dict[str, Any]] = {}
+        self._metrics: dict[str, dict[str, int | None]] = {}
+        self._dirty: set[str] = set()
+        self._task: asyncio.Task[None] | None = None
+        self.events = EventBus()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _mark_dirty(self, name: str) -> None:
+        self._dirty.add(name)
+
+    def record_metric(self, name: str, data: MetricData) -> None:
+        self._metrics[name] = {
+            field: int(getattr(data, field)) for field in METRIC_FIELDS
+        }
+        self._dirty.add(name)
+
+    def _row(self, name: str) -> dict[str, Any] | None:
+        client = client_registry.get(name)
+        if client is None:
+            return None
+        row: dict[str, Any] = {
+            "name": name,
+            "polledTime": float(client.polled_time or 0),
+            "status": client_registry.liveness.status(name),
+        }
+        metric = self._metrics.get(name, {})
+        for field, key in METRIC_FIELDS.items():
+            row[key] = metric.get(field)
+        return row
+
+    def snapshot(self) -> dict[str, Any]:
+        # Ordered by name, like the default order of /manage/data
+        return {
+            "type": "snapshot",
+            "clients": [self._rows[name] for name in sorted(self._rows)],
+        }
+
+    def update(self) -> None:
+        """Rebuild the dirty rows and publish what changed"""
+        dirty, self._dirty = self._dirty, set()
+        changed: list[dict[str, Any]] = []
+        removed: list[str] = []
+        for name in dirty:
+            row = self._row(name)
+            previous = self._rows.get(name)
+            if row is None:
+                self._metrics.pop(name, None)
+                if self._rows.pop(name, None) is not None:
+                    removed.append(name)
+                continue
+            self._rows[name] = row
+            if previous is None:
+                changed.append(row)
+            elif delta := {k: v for k, v in row.items() if previous.get(k) != v}:
+                changed.append({"name": name, **delta})
+        if changed or removed:
+            self.events.publish(
+                to_json(
+                    {"type": "delta", "clients": changed, "removed": removed}
+                ).decode()
+            )
+
+    async def stream(
+        self, last_event_id: int | None = None
+    ) -> AsyncGenerator[str, None]:
+        """A snapshot followed by the deltas, as server-sent events
+
+        A reconnecting dashboard resumes from `last_event_id` while the
+        deltas it missed are still buffered, otherwise it gets a new
+        snapshot. The same happens when it falls behind the buffer.
+        """
+        snapshot_id = 0
+        if last_event_id is None or not self.events.covers(last_event_id):
+            last_event_id = snapshot_id = self.events.last_id
+            yield format_event(snapshot_id, to_json(self.snapshot()).decode())
+        async for event in self.events.subscribe(last_event_id):
+            if event.kind == "dropped":
+                # The bus dropped deltas this stream had not read yet
+                snapshot_id = self.events.last_id
+                yield format_event(snapshot_id, to_json(self.snapshot()).decode())
+            elif event.id > snapshot_id:
+                yield format_event(event.id, event.data)
+
+    async def load(self) -> None:
+        db_session = await open_db_session()
+        try:
+            result = await db_session.execute(select(Metric))
+            self._metrics = {
+                metric.name: {field: getattr(metric, field) for field in METRIC_FIELDS}
+                for metric in result.scalars()
+            }
+        finally:
+            await db_session.close()
+        for name in client_registry.names():
+            if row := self._row(name):
+                self._rows[name] = row
+
+    async def _update_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.update()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to update fleet view")
+
+    async def start(self) -> None:
+        if self.events.closed:
+            self.events = EventBus()
+        await self.load()
+        client_registry.add_change_listener(self._mark_dirty)
+        self._task = asyncio.create_task(self._update_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            client_registry.remove_change_listener(self._mark_dirty)
+        self.events.close()
+
+
+fleet_view = FleetView()
@@ -1,45 +1,65 @@
 import asyncio
-import random
+import time
 import uuid
-from collections import deque
 from datetime import datetime
-from typing import Any, AsyncGenerator, Callable
+from typing import Any, AsyncGenerator
 
 from app.core.config import settings
-from app.core.database import open_db_session
-from app.models.order import Order
-
-
-async def get_random_open_port(
-    port_start: int = int(settings.port_range_start),
-    port_end: int = int(settings.port_range_end),
-    local_address: str = settings.local_address,
-) -> int:
-    while True:
-        port = random.randint(port_start, port_end)
-        try:
-            server = await asyncio.start_server(lambda r, w: None, local_address, port)
-            server.close()
-            await server.wait_closed()
-            return port
-        except OSError:
-            continue
+from app.services.client_registry import client_registry
+from app.services.events import EventBus, format_event
+from app.services.multiplex import Multiplexer, MultiplexError
+from app.services.port_pool import port_pool
+from app.services.relay import (
+    ChunkCallback,
+    RelayEndpoint,
+    RelayEngine,
+    RelayUnavailableError,
+    StreamPair,
+    get_relay_engines,
+)
+from app.services.standby_pool import standby_pool
+from app.services.traffic import TrafficCounters
+from app.services.tunnel_policy import TokenBucket, TunnelPolicy, global_bandwidth
+
+
+class ForwarderLimitError(Exception):
+    """Raised when `max_forwarders` forwarders are already running."""
 
 
 class Forwarder:
     def __init__(
-        self, client_name: str, response_queue: deque[str], connection_timeout: int
+        self,
+        client_name: str,
+        connection_timeout: int,
+        policy: TunnelPolicy | None = None,
+        multiplex: bool = False,
+        target: StreamPair | None = None,
     ) -> None:
         self._client_name = client_name
         self._connection_timeout = connection_timeout
-        self._connection_future: asyncio.Future[
-            tuple[asyncio.StreamReader, asyncio.StreamWriter]
-        ] | None = None
-        self.response_queue = response_queue
+        self.policy = policy or TunnelPolicy()
+        self.multiplex = multiplex
+        self._multiplexer: Multiplexer | None = None
+        # A back-connection the client parked in advance
+        self._target = target
+        self._connection_future: (
+            asyncio.Future[tuple[asyncio.StreamReader, asyncio.StreamWriter]] | None
+        ) = None
+        self._servers: dict[str, tuple[asyncio.Server, int]] = {}
+        self.events = EventBus()
+        self.traffic = TrafficCounters()
+
+    @property
+    def client_name(self) -> str:
+        return self._client_name
+
+    @property
+    def ports(self) -> dict[str, int]:
+        return {role: port for role, (_, port) in self._servers.items()}
 
     def _log(self, msg: str) -> None:
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.response_queue.append(f"[{timestamp}] {msg}")
+        self.events.publish(f"[{timestamp}] {msg}")
 
     async def _log_custom_messages(self, port: int) -> None:
         username = await self.get_client_username()
@@ -51,17 +71,41 @@ class Forwarder:
     ) -> None:
         if self._connection_future and not self._connection_future.done():
             self._connection_future.set_result((reader, writer))
+        else:
+            # Nobody is waiting for it; left open it would also keep the
+            # server's wait_closed() from returning
+            writer.close()
 
-    async def _create_server(
-        self, port: int | None = None
-    ) -> tuple[asyncio.Server, int]:
-        if port is None:
-            port = await get_random_open_port()
+    async def _source_connection_handler(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if self._multiplexer is not None:
+            await self._multiplexer.open_stream(reader, writer)
+        elif self.multiplex:
+            # Streams can only be opened once the client is connected
+            writer.close()
+        else:
+            await self._connection_handler(reader, writer)
+
+    async def open_servers(self) -> None:
+        """Lease the source and target listening ports from the port pool"""
+        handlers = {
+            "source": self._source_connection_handler,
+            "target": self._connection_handler,
+        }
+        if self._target:
+            del handlers["target"]
+        try:
+            for role, handler in handlers.items():
+                self._servers[role] = await port_pool.lease(handler)
+        except Exception:
+            await self._close_servers()
+            raise
 
-        server = await asyncio.start_server(
-            self._connection_handler, settings.local_address, port
-        )
-        return server, port
+    async def _close_servers(self) -> None:
+        while self._servers:
+            _, (server, port) = self._servers.popitem()
+            await port_pool.close(server, port)
 
     async def _wait_for_connection(
         self,
@@ -74,27 +118,98 @@ class Forwarder:
         finally:
             self._connection_future = None
 
+    def _chunk_callback(self, direction: str) -> ChunkCallback:
+        """Count the chunks of one direction and apply the bandwidth limits"""
+        counters = self.traffic.direction(direction)
+        count: ChunkCallback = counters.add
+        if settings.relay_debug_log:
+
+            def count(size: int) -> None:
+                counters.add(size)
+                self._log(f"{direction}: {size} bytes")
+
+        on_chunk = count
+        buckets = [global_bandwidth] if global_bandwidth else []
+        if self.policy.bandwidth_limit:
+            buckets.append(TokenBucket(self.policy.bandwidth_limit))
+        if buckets:
+
+            def on_chunk(size: int) -> float:
+                count(size)
+                return max(bucket.consume(size) for bucket in buckets)
+
+        return on_chunk
+
     async def relay(
-        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, direction: str
+        self,
+        engine: RelayEngine,
+        source: RelayEndpoint,
+        target: RelayEndpoint,
+        direction: str,
     ) -> None:
         try:
-            while True:
-                data = await reader.read(4096)
-                if not data:
-                    self._log(f"{direction}: connection closed")
-                    break
-                self._log(f"{direction}: {len(data)} bytes")
-                writer.write(data)
-                await writer.drain()
+            await engine.relay(source, target, self._chunk_callback(direction))
+            self._log(f"{direction}: connection closed")
         except Exception as e:
             self._log(f"{direction} relay error: {e}")
         finally:
+            target.shutdown_write()
+
+    async def _enforce_timeouts(self) -> None:
+        """Return once the relay was idle or open for longer than allowed
+
+        Activity is read from the traffic counters, so the relay loops do
+        no extra work per chunk; this task only wakes up a few times per
+        timeout.
+        """
+        idle_timeout = self.policy.idle_timeout
+        max_lifetime = self.policy.max_lifetime
+        started = last_active = time.monotonic()
+        last_total = self.traffic.total_bytes
+        while True:
+            now = time.monotonic()
+            if (total := self.traffic.total_bytes) != last_total:
+                last_total, last_active = total, now
+            deadlines = []
+            if max_lifetime:
+                if now - started >= max_lifetime:
+                    self._log(f"Maximum lifetime of {max_lifetime:g}s reached")
+                    return
+                deadlines.append(started + max_lifetime)
+            if idle_timeout:
+                if now - last_active >= idle_timeout:
+                    self._log(f"Idle for {idle_timeout:g}s")
+                    return
+                # Activity is only noticed when checking, so check often
+                # enough to close within a quarter of the timeout
+                deadlines.append(
+                    min(last_active + idle_timeout, now + idle_timeout / 4)
+                )
+            await asyncio.sleep(min(deadlines) - now)
+
+    async def _report_traffic(self) -> None:
+        while True:
+            await asyncio.sleep(settings.traffic_report_interval)
+            if summary := self.traffic.summary():
+                self._log(summary)
+
+    async def _open_relay(
+        self,
+        source: tuple[asyncio.StreamReader, asyncio.StreamWriter],
+        target: tuple[asyncio.StreamReader, asyncio.StreamWriter],
+    ) -> tuple[RelayEngine, RelayEndpoint, RelayEndpoint]:
+        """Pick the fastest engine both sides support, falling back in order"""
+        for engine in get_relay_engines():
+            if not (engine.supports(source[1]) and engine.supports(target[1])):
+                continue
             try:
-                writer.write_eof()
-            except (AttributeError, OSError):
-                pass
-            writer.close()
-            await writer.wait_closed()
+                source_endpoint, target_endpoint = await engine.open(source, target)
+            except RelayUnavailableError as e:
+                self._log(f"{engine.name} relay unavailable: {e}")
+                continue
+            return engine, source_endpoint, target_endpoint
+
+        raise RelayUnavailableError("no relay engine available")
 
     async def handle_connection(
         self,
@@ -103,51 +218,109 @@ class Forwarder:
         target_reader: asyncio.StreamReader,
         target_writer: asyncio.StreamWriter,
     ) -> None:
+        engine, source, target = await self._open_relay(
+            (source_reader, source_writer), (target_reader, target_writer)
+        )
+        self._log(f"relay engine: {engine.name}")
         try:
-            source_to_target = asyncio.create_task(
-                self.relay(source_reader, target_writer, "source->target")
-            )
-            target_to_source = asyncio.create_task(
-                self.relay(target_reader, source_writer, "target->source")
+            await self._supervise(
+                [
+                    asyncio.create_task(
+                        self.relay(engine, source, target, "source->target")
+                    ),
+                    asyncio.create_task(
+                        self.relay(engine, target, source, "target->source")
+                    ),
+                ]
             )
+        finally:
+            for endpoint in [source, target]:
+                await endpoint.close()
+
+    async def _supervise(self, tasks: list[asyncio.Task[None]]) -> None:
+        """Run the relay tasks until one ends or a policy limit is reached"""
+        if policy := self.policy.describe():
+            self._log(f"tunnel policy: {policy}")
+        if self.policy.has_timeouts:
+            tasks.append(asyncio.create_task(self._enforce_timeouts()))
+        tasks.append(asyncio.create_task(self._report_traffic()))
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if summary := self.traffic.summary(final=True):
+                self._log(summary)
 
-            await asyncio.wait(
-                [source_to_target, target_to_source],
-                return_when=asyncio.FIRST_COMPLETED,
+    async def handle_multiplexed(
+        self,
+        target_reader: asyncio.StreamReader,
+        target_writer: asyncio.StreamWriter,
+        source_port: int,
+    ) -> None:
+        """Accept operator connections as streams until the client leaves"""
+        multiplexer = Multiplexer(
+            target_reader,
+            target_writer,
+            window=settings.mux_window_size,
+            max_frame=settings.relay_buffer_size,
+            max_streams=settings.mux_max_streams,
+            on_sent=self._chunk_callback("source->target"),
+            on_received=self._chunk_callback("target->source"),
+            log=self._log,
+        )
+        self._multiplexer = multiplexer
+        self._log(f"multiplexing connections from client port: {source_port}")
+        await self._log_custom_messages(source_port)
+        try:
+            await self._supervise(
+                [asyncio.create_task(self._run_multiplexer(multiplexer))]
             )
-
         finally:
-            source_to_target.cancel()
-            target_to_source.cancel()
+            self._multiplexer = None
+            multiplexer.close()
 
-            for writer in [source_writer, target_writer]:
-                writer.close()
-                await writer.wait_closed()
+    async def _run_multiplexer(self, multiplexer: Multiplexer) -> None:
+        try:
+            await multiplexer.run()
+        except MultiplexError as e:
+            self._log(f"multiplexing error: {e}")
 
     async def start(self, job_id: str, jobs: dict) -> None:
-        source_server = None
-        target_server = None
-
+        writers: list[asyncio.StreamWriter] = []
         try:
-            source_server, source_port = await self._create_server()
-            target_server, target_port = await self._create_server()
-
-            await self._handle_connection(target_port)
-            self._log(
-                f"waiting for connection from {self._client_name} port: {target_port}"
-            )
-
-            target_reader, target_writer = await asyncio.wait_for(
-                self._wait_for_connection(), timeout=self._connection_timeout
-            )
-
-            self._log(f"{self._client_name} connected.")
+            if not self._servers:
+                await self.open_servers()
+            source_port = self._servers["source"][1]
+
+            if self._target:
+                target_reader, target_writer = self._target
+                self._log(f"{self._client_name} connected from standby.")
+            else:
+                target_port = self._servers["target"][1]
+                await self._handle_connection(target_port)
+                self._log(
+                    f"waiting for connection from {self._client_name} "
+                    f"port: {target_port}"
+                )
+
+                target_reader, target_writer = await asyncio.wait_for(
+                    self._wait_for_connection(), timeout=self._connection_timeout
+                )
+                self._log(f"{self._client_name} connected.")
+            writers.append(target_writer)
+
+            if self.multiplex:
+                await self.handle_multiplexed(target_reader, target_writer, source_port)
+                return
             self._log(f"waiting for connection from client port: {source_port}")
             await self._log_custom_messages(source_port)
 
             source_reader, source_writer = await asyncio.wait_for(
                 self._wait_for_connection(), timeout=self._connection_timeout
             )
+            writers.append(source_writer)
 
             source_addr = source_writer.get_extra_info("peername")
             self._log(f"client connected from: {source_addr}")
@@ -161,84 +334,129 @@ class Forwarder:
         except Exception as e:
             self._log(f"Error: {e}")
         finally:
-            if source_server:
-                source_server.close()
-                await source_server.wait_closed()
-            if target_server:
-                target_server.close()
-                await target_server.wait_closed()
+            # Connections still open would keep the servers from closing
+            for writer in writers:
+                writer.close()
+            await self._close_servers()
 
             self._log("Connection closed")
             await self._handle_disconnection()
             self._log("disconnect")
             if job_id in jobs:
                 del jobs[job_id]
+            self.events.close()
 
     async def get_client_username(self) -> str:
-        db_session = await open_db_session()
-        try:
-            if record := await db_session.get(Order, self._client_name):
-                return record.username if record and record.username else "<unknown>"
-            return "<unknown>"
-        finally:
-            await db_session.close()
+        if (client := client_registry.get(self._client_name)) and client.username:
+            return client.username
+        return "<unknown>"
 
     async def _handle_connection(self, port: int) -> None:
-        db_session = await open_db_session()
-        try:
-            if record := await db_session.get(Order, self._client_name):
-                record.port = int(port)
-                await db_session.commit()
-        finally:
-            await db_session.close()
+        client_registry.set_port(self._client_name, int(port), self.multiplex)
 
     async def _handle_disconnection(self) -> None:
-        db_session = await open_db_session()
-        try:
-            if record := await db_session.get(Order, self._client_name):
-                await db_session.delete(record)
-                await db_session.commit()
-        finally:
-            await db_session.close()
+        await client_registry.delete(self._client_name)
 
 
 class ForwarderManager:
-    def __init__(self) -> None:
+    """Runs forwarders as tasks it owns
+
+    Cancelling a forwarder cancels its task, which stops the relays, closes
+    both listening servers and returns their ports to the pool before
+    `cancel_forwarder` returns. At most `max_forwarders` run at once.
+    """
+
+    def __init__(self, max_forwarders: int = settings.max_forwarders) -> None:
         self._forwarders: dict[str, Forwarder] = {}
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._traffic: dict[str, TrafficCounters] = {}
+        self._finished_bytes: dict[str, int] = {}
+        self.max_forwarders = max_forwarders
 
     async def create_forwarder(
-        self, client_name: str, connection_timeout: int = 120
-    ) -> tuple[str, Callable]:
-        response_queue: deque[str] = deque()
-        forwarder = Forwarder(client_name, response_queue, connection_timeout)
+        self,
+        client_name: str,
+        connection_timeout: int = 120,
+        policy: TunnelPolicy | None = None,
+        multiplex: bool = False,
+    ) -> str:
+        if len(self._forwarders) >= self.max_forwarders:
+            raise ForwarderLimitError(
+                f"Forwarder limit reached: {self.max_forwarders} running"
+            )
+        target = await standby_pool.claim(client_name, multiplex)
+        forwarder = Forwarder(
+            client_name, connection_timeout, policy, multiplex, target
+        )
+        try:
+            await forwarder.open_servers()
+        except Exception:
+            if target:
+                target[1].close()
+            raise
         forwarder_id = str(uuid.uuid4().hex)
         self._forwarders[forwarder_id] = forwarder
-        return forwarder_id, forwarder.start
+        task = asyncio.create_task(forwarder.start(forwarder_id, self._forwarders))
+        self._tasks[forwarder_id] = task
+        self._traffic[forwarder_id] = forwarder.traffic
+        task.add_done_callback(lambda _: self._finish(forwarder_id))
+        # Let the task publish the order and enter its try block, so the
+        # client sees its port and an early cancel still closes the servers
+        await asyncio.sleep(0)
+        return forwarder_id
+
+    def _finish(self, forwarder_id: str) -> None:
+        self._tasks.pop(forwarder_id, None)
+        if traffic := self._traffic.pop(forwarder_id, None):
+            for direction, counters in traffic.directions.items():
+                self._finished_bytes[direction] = (
+                    self._finished_bytes.get(direction, 0) + counters.bytes
+                )
+
+    def relayed_bytes(self) -> dict[str, int]:
+        """Bytes relayed per direction by all forwarders since startup"""
+        totals = dict(self._finished_bytes)
+        for traffic in self._traffic.values():
+            for direction, counters in traffic.directions.items():
+                totals[direction] = totals.get(direction, 0) + counters.bytes
+        return totals
+
+    @property
+    def subscribers(self) -> int:
+        return sum(
+            forwarder.events.subscribers for forwarder in self._forwarders.values()
+        )
 
     async def get_forwarder_responses(
-        self, forwarder_id: str
+        self, forwarder_id: str, last_event_id: int | None = None
     ) -> AsyncGenerator[str, None]:
         forwarder = self._forwarders.get(forwarder_id)
         if forwarder:
-            while forwarder_id in self._forwarders:
-                if forwarder.response_queue:
-                    message = forwarder.response_queue.popleft()
-                    yield f"data: {message}\n\n"
-                else:
-                    await asyncio.sleep(0.1)
+            async for event in forwarder.events.subscribe(last_event_id):
+                yield format_event(event.id, event.data)
             # Send a final message indicating the stream is closing
             yield "data: [STREAM_END]\n\n"
 
     def is_forwarder_running(self, forwarder_id: str) -> bool:
         return forwarder_id in self._forwarders
 
-    def cancel_forwarder(self, forwarder_id: str) -> bool:
-        if forwarder_id in self._forwarders:
-            forwarder = self._forwarders[forwarder_id]
-            forwarder.response_queue.append("Forwarder cancelled by server")
-            del self._forwarders[forwarder_id]
-            return True
-        return False
+    async def cancel_forwarder(self, forwarder_id: str) -> bool:
+        forwarder = self._forwarders.get(forwarder_id)
+        task = self._tasks.get(forwarder_id)
+        if forwarder is None or task is None:
+            return False
+        forwarder.events.publish("Forwarder cancelled by server")
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    async def stop(self) -> None:
+        await asyncio.gather(
+            *(self.cancel_forwarder(forwarder_id) for forwarder_id in list(self._tasks))
+        )
 
     def get_forwarder(self, forwarder_id: str) -> Forwarder | None:
         return self._forwarders.get(forwarder_id)
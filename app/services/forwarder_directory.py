@@ -0,0 +1,318 @@
+import asyncio
+import os
+import socket
+import time
+from typing import AsyncGenerator
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import open_db_session, open_write_session
+from app.models.forwarder import ForwarderEvent, ForwarderRecord
+from app.services.client_registry import client_registry
+from app.services.events import format_event
+from app.services.forwarder import Forwarder, forwarder_manager
+from app.services.port_pool import port_pool
+from app.utils.logger import logger
+from app.utils.time_utils import get_time
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _Published:
+    """A local forwarder and how far its events have been written out"""
+
+    __slots__ = ("forwarder", "cursor")
+
+    def __init__(self, forwarder: Forwarder) -> None:
+        self.forwarder = forwarder
+        self.cursor = 0
+
+
+class ForwarderDirectory:
+    """Finds the worker owning a forwarder and routes requests to it
+
+    In `local` mode (a single worker) every call goes straight to the
+    process-local `forwarder_manager`. In `database` mode each forwarder is
+    also recorded in the `forwarder` table with its owner and ports, and a
+    sync task per worker:
+
+    - writes the events of its own forwarders to `forwarder_event`, so a
+      status stream opened on any worker can follow them
+    - picks up cancellations requested by other workers
+    - applies the ports of all running forwarders to the client registry,
+      so a client gets its order from whichever worker it polls, and
+      reserves other workers' ports in the port pool
+    - heartbeats its own rows and finishes the rows of dead workers
+    """
+
+    def __init__(
+        self,
+        mode: str = settings.forwarder_directory,
+        sync_interval: float = settings.forwarder_sync_interval,
+        owner_timeout: float = settings.forwarder_owner_timeout,
+    ) -> None:
+        self._shared = mode == "database"
+        self._sync_interval = sync_interval
+        self._owner_timeout = owner_timeout
+        self._published: dict[str, _Published] = {}
+        self._last_housekeeping = 0.0
+        self._task: asyncio.Task[None] | None = None
+        self.remote_subscribers = 0
+
+    @property
+    def shared(self) -> bool:
+        return self._shared
+
+    async def register(self, forwarder_id: str, forwarder: Forwarder) -> None:
+        if not self._shared:
+            return
+        self._published[forwarder_id] = _Published(forwarder)
+        db_session = await open_write_session()
+        try:
+            db_session.add(
+                ForwarderRecord(
+                    id=forwarder_id,
+                    client_name=forwarder.client_name,
+                    owner=WORKER_ID,
+                    source_port=forwarder.ports["source"],
+                    # No target port when the client's standby connection is used
+                    target_port=forwarder.ports.get("target", 0),
+                    multiplex=forwarder.multiplex,
+                    heartbeat_time=int(get_time()),
+                )
+            )
+            await db_session.commit()
+        finally:
+            await db_session.close()
+
+    async def _get_record(self, forwarder_id: str) -> ForwarderRecord | None:
+        db_session = await open_db_session()
+        try:
+            return await db_session.get(ForwarderRecord, forwarder_id)
+        finally:
+            await db_session.close()
+
+    async def is_running(self, forwarder_id: str) -> bool:
+        if forwarder_manager.is_forwarder_running(forwarder_id):
+            return True
+        if not self._shared:
+            return False
+        record = await self._get_record(forwarder_id)
+        return record is not None and not record.finished
+
+    async def get_responses(
+        self, forwarder_id: str, last_event_id: int | None = None
+    ) -> AsyncGenerator[str, None]:
+        if forwarder_manager.is_forwarder_running(forwarder_id) or not self._shared:
+            async for message in forwarder_manager.get_forwarder_responses(
+                forwarder_id, last_event_id
+            ):
+                yield message
+            return
+
+        async for message in self._remote_responses(forwarder_id, last_event_id):
+            yield message
+
+    async def _remote_responses(
+        self, forwarder_id: str, last_event_id: int | None
+    ) -> AsyncGenerator[str, None]:
+        """Follow the events another worker writes for its forwarder"""
+        self.remote_subscribers += 1
+        try:
+            async for message in self._poll_events(forwarder_id, last_event_id):
+                yield message
+        finally:
+            self.remote_subscribers -= 1
+
+    async def _poll_events(
+        self, forwarder_id: str, last_event_id: int | None
+    ) -> AsyncGenerator[str, None]:
+        cursor = last_event_id or 0
+        while True:
+            db_session = await open_db_session()
+            try:
+                # Read the record first: once it is finished, the events
+                # read after it include everything the owner wrote
+                record = await db_session.get(ForwarderRecord, forwarder_id)
+                result = await db_session.execute(
+                    select(ForwarderEvent.event_id, ForwarderEvent.data)
+                    .where(
+                        ForwarderEvent.forwarder_id == forwarder_id,
+                        ForwarderEvent.event_id > cursor,
+                    )
+                    .order_by(ForwarderEvent.event_id)
+                )
+                events = result.all()
+            finally:
+                await db_session.close()
+
+            for event_id, data in events:
+                if event_id > cursor + 1:
+                    yield format_event(
+                        event_id - 1, f"{event_id - 1 - cursor} messages dropped"
+                    )
+                yield format_event(event_id, data)
+                cursor = event_id
+            if record is None or record.finished:
+                break
+            await asyncio.sleep(self._sync_interval)
+        yield "data: [STREAM_END]\n\n"
+
+    async def cancel(self, forwarder_id: str) -> bool:
+        if await forwarder_manager.cancel_forwarder(forwarder_id):
+            return True
+        if not self._shared:
+            return False
+        db_session = await open_write_session()
+        try:
+            result = await db_session.execute(
+                update(ForwarderRecord)
+                .where(
+                    ForwarderRecord.id == forwarder_id,
+                    ForwarderRecord.finished.is_(False),
+                )
+                .values(cancel_requested=True)
+            )
+            await db_session.commit()
+        finally:
+            await db_session.close()
+        return bool(result.rowcount)  # type: ignore[attr-defined]
+
+    async def sync(self) -> None:
+        now = int(get_time())
+        rows = []
+        finished = []
+        for forwarder_id, published in self._published.items():
+            events = published.forwarder.events.since(published.cursor)
+            rows += [
+                {"forwarder_id": forwarder_id, "event_id": event.id, "data": event.data}
+                for event in events
+            ]
+            if events:
+                published.cursor = events[-1].id
+            if not forwarder_manager.is_forwarder_running(forwarder_id):
+                finished.append(forwarder_id)
+
+        housekeeping = (
+            time.monotonic() - self._last_housekeeping >= self._owner_timeout / 3
+        )
+        db_session = await open_write_session()
+        try:
+            if rows:
+                await db_session.execute(insert(ForwarderEvent), rows)
+            if finished:
+                await db_session.execute(
+                    update(ForwarderRecord)
+                    .where(ForwarderRecord.id.in_(finished))
+                    .values(finished=True, heartbeat_time=now)
+                )
+            if housekeeping:
+                await self._housekeeping(db_session, now)
+            if rows or finished or housekeeping:
+                await db_session.commit()
+        finally:
+            await db_session.close()
+        for forwarder_id in finished:
+            del self._published[forwarder_id]
+        if housekeeping:
+            self._last_housekeeping = time.monotonic()
+
+        db_session = await open_db_session()
+        try:
+            result = await db_session.execute(
+                select(ForwarderRecord).where(ForwarderRecord.finished.is_(False))
+            )
+            records = list(result.scalars())
+        finally:
+            await db_session.close()
+
+        remote = [record for record in records if record.owner != WORKER_ID]
+        for record in records:
+            if record.owner == WORKER_ID and record.cancel_requested:
+                await forwarder_manager.cancel_forwarder(record.id)
+        port_pool.reserved = {
+            port
+            for record in remote
+            for port in (record.source_port, record.target_port)
+        }
+        client_registry.sync_ports(
+            {
+                record.client_name: (record.target_port, record.multiplex)
+                for record in records
+                if record.target_port
+            }
+        )
+
+    async def _housekeeping(self, db_session: AsyncSession, now: int) -> None:
+        # Heartbeat our own rows, finish the rows of workers that stopped
+        # heartbeating and drop finished rows once streams had time to end
+        await db_session.execute(
+            update(ForwarderRecord)
+            .where(
+                ForwarderRecord.owner == WORKER_ID,
+                ForwarderRecord.finished.is_(False),
+            )
+            .values(heartbeat_time=now)
+        )
+        await db_session.execute(
+            update(ForwarderRecord)
+            .where(
+                ForwarderRecord.finished.is_(False),
+                ForwarderRecord.heartbeat_time < now - self._owner_timeout,
+            )
+            .values(finished=True, heartbeat_time=now)
+        )
+        expired = select(ForwarderRecord.id).where(
+            ForwarderRecord.finished.is_(True),
+            ForwarderRecord.heartbeat_time < now - self._owner_timeout,
+        )
+        await db_session.execute(
+            delete(ForwarderEvent).where(ForwarderEvent.forwarder_id.in_(expired))
+        )
+        await db_session.execute(
+            delete(ForwarderRecord).where(ForwarderRecord.id.in_(expired))
+        )
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._sync_interval)
+            try:
+                await self.sync()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to sync forwarder directory")
+
+    async def start(self) -> None:
+        if self._shared:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self.sync()
+            await self._release_own()
+
+    async def _release_own(self) -> None:
+        """Finish our rows, their tunnels end with this process"""
+        db_session = await open_write_session()
+        try:
+            await db_session.execute(
+                update(ForwarderRecord)
+                .where(
+                    ForwarderRecord.owner == WORKER_ID,
+                    ForwarderRecord.finished.is_(False),
+                )
+                .values(finished=True, heartbeat_time=int(get_time()))
+            )
+            await db_session.commit()
+        finally:
+            await db_session.close()
+
+
+forwarder_directory = ForwarderDirectory()
@@ -0,0 +1,174 @@
+import asyncio
+import math
+from typing import Callable, Literal
+
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.time_utils import get_time
+
+ClientStatus = Literal["online", "stale", "offline"]
+StatusListener = Callable[[str, ClientStatus, ClientStatus | None], None]
+
+
+class TimerWheel:
+    """Hashed timer wheel of keyed deadlines counted in ticks
+
+    A deadline is filed in the slot of its tick modulo the number of
+    slots, so scheduling, rescheduling and cancelling are dict operations
+    and advancing the wheel only visits the slots of the ticks that
+    passed. Deadlines more than one revolution away stay in their slot
+    until their round comes up.
+    """
+
+    def __init__(self, slots: int, tick: int = 0) -> None:
+        self._slots: list[dict[str, int]] = [{} for _ in range(slots)]
+        self._deadlines: dict[str, int] = {}
+        self.tick = tick
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, key: str, tick: int) -> None:
+        self.cancel(key)
+        tick = max(tick, self.tick + 1)
+        self._slots[tick % len(self._slots)][key] = tick
+        self._deadlines[key] = tick
+
+    def cancel(self, key: str) -> None:
+        tick = self._deadlines.pop(key, None)
+        if tick is not None:
+            del self._slots[tick % len(self._slots)][key]
+
+    def advance(self, tick: int) -> list[str]:
+        """Move the wheel to `tick`, returns the keys that came due"""
+        due: list[str] = []
+        # After a long pause every slot is visited once instead of every tick
+        for passed in range(max(self.tick + 1, tick - len(self._slots) + 1), tick + 1):
+            slot = self._slots[passed % len(self._slots)]
+            if not slot:
+                continue
+            expired = [key for key, deadline in slot.items() if deadline <= tick]
+            for key in expired:
+                del slot[key]
+                del self._deadlines[key]
+            due.extend(expired)
+        self.tick = max(self.tick, tick)
+        return due
+
+
+class LivenessTracker:
+    """Online, stale and offline state of the clients
+
+    Every heartbeat makes a client online and (re)schedules its stale
+    deadline `stale_after` seconds ahead; a stale client is scheduled to
+    go offline `offline_after` seconds after its last heartbeat. The
+    deadlines live in a `TimerWheel` with `tick` second resolution, so a
+    heartbeat costs a few dict operations and a tick only touches the
+    clients that are due, whatever the size of the fleet. Listeners are
+    called with the name, new status and previous status of every
+    transition.
+    """
+
+    def __init__(
+        self,
+        stale_after: float = settings.liveness_stale_after,
+        offline_after: float = settings.liveness_offline_after,
+        tick: float = settings.liveness_tick,
+        slots: int = settings.liveness_wheel_slots,
+    ) -> None:
+        self._stale_after = stale_after
+        self._offline_after = max(offline_after, stale_after)
+        self._tick = tick
+        self._wheel = TimerWheel(slots, self._tick_of(get_time()))
+        self._status: dict[str, ClientStatus] = {}
+        self._last_seen: dict[str, float] = {}
+        self._listeners: list[StatusListener] = []
+        self._task: asyncio.Task[None] | None = None
+
+    def _tick_of(self, timestamp: float) -> int:
+        return math.floor(timestamp / self._tick)
+
+    def _deadline(self, timestamp: float) -> int:
+        return math.ceil(timestamp / self._tick)
+
+    def add_listener(self, listener: StatusListener) -> None:
+        self._listeners.append(listener)
+
+    def status(self, name: str) -> ClientStatus | None:
+        return self._status.get(name)
+
+    def counts(self) -> dict[str, int]:
+        counts = {"online": 0, "stale": 0, "offline": 0}
+        for status in self._status.values():
+            counts[status] += 1
+        return counts
+
+    def touch(self, name: str, timestamp: float) -> None:
+        """Record a heartbeat"""
+        self._last_seen[name] = timestamp
+        self._wheel.schedule(name, self._deadline(timestamp + self._stale_after))
+        self._set(name, "online")
+
+    def restore(self, name: str, timestamp: float | None) -> ClientStatus:
+        """Track a client known from before, last seen at `timestamp`
+
+        Sets the status its age implies without telling the listeners,
+        the transitions happened while nobody was watching.
+        """
+        if timestamp is None or get_time() - timestamp >= self._offline_after:
+            self._status[name] = "offline"
+            return "offline"
+
+        age = get_time() - timestamp
+        self._last_seen[name] = timestamp
+        if age >= self._stale_after:
+            self._status[name] = "stale"
+            deadline = timestamp + self._offline_after
+        else:
+            self._status[name] = "online"
+            deadline = timestamp + self._stale_after
+        self._wheel.schedule(name, self._deadline(deadline))
+        return self._status[name]
+
+    def forget(self, name: str) -> None:
+        self._wheel.cancel(name)
+        self._status.pop(name, None)
+        self._last_seen.pop(name, None)
+
+    def advance(self, timestamp: float) -> None:
+        for name in self._wheel.advance(self._tick_of(timestamp)):
+            if self._status.get(name) == "online":
+                self._set(name, "stale")
+                offline_at = self._last_seen[name] + self._offline_after
+                self._wheel.schedule(name, self._deadline(offline_at))
+            else:
+                self._set(name, "offline")
+                self._last_seen.pop(name, None)
+
+    def _set(self, name: str, status: ClientStatus) -> None:
+        previous = self._status.get(name)
+        if previous == status:
+            return
+        self._status[name] = status
+        for listener in self._listeners:
+            listener(name, status, previous)
+
+    async def _tick_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._tick)
+            try:
+                self.advance(get_time())
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to advance client liveness")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._tick_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
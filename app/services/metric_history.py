@@ -0,0 +1,319 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, NamedTuple
+
+from sqlalchemy import and_, case, delete, or_, select
+
+from app.core.config import settings
+from app.core.database import open_db_session, open_write_session, upsert
+from app.models.metric_sample import MetricSample
+from app.schemas.client import MetricData
+from app.utils.logger import logger
+from app.utils.time_utils import get_time
+
+RESOLUTIONS: dict[str, int] = {"raw": 0, "1m": 60, "1h": 3600}
+MEAN_FIELDS = ("uptime", "cpu_usage", "memory_usage", "disk_usage", "temperature")
+MAX_FIELDS = ("cpu_usage_max", "temperature_max")
+
+
+class MetricPoint(NamedTuple):
+    timestamp: int
+    samples: int
+    uptime: float
+    cpu_usage: float
+    memory_usage: float
+    disk_usage: float
+    temperature: float
+    cpu_usage_max: float
+    temperature_max: float
+
+    def to_row(self, name: str, resolution: int) -> dict[str, Any]:
+        return {"name": name, "resolution": resolution, **self._asdict()}
+
+    @classmethod
+    def from_row(cls, row: Any) -> "MetricPoint":
+        if isinstance(row, dict):
+            return cls(*(row[field] for field in cls._fields))
+        return cls(*(getattr(row, field) for field in cls._fields))
+
+    def merge(self, other: "MetricPoint") -> "MetricPoint":
+        """The point of the samples of both points, which share a bucket"""
+        samples = self.samples + other.samples
+        means = {
+            field: (
+                getattr(self, field) * self.samples
+                + getattr(other, field) * other.samples
+            )
+            / samples
+            for field in MEAN_FIELDS
+        }
+        return MetricPoint(
+            timestamp=self.timestamp,
+            samples=samples,
+            cpu_usage_max=max(self.cpu_usage_max, other.cpu_usage_max),
+            temperature_max=max(self.temperature_max, other.temperature_max),
+            **means,
+        )
+
+
+def merge_points(points: list[MetricPoint]) -> list[MetricPoint]:
+    """Merge the points sharing a timestamp, ordered by timestamp"""
+    merged: dict[int, MetricPoint] = {}
+    for point in points:
+        previous = merged.get(point.timestamp)
+        merged[point.timestamp] = point if previous is None else previous.merge(point)
+    return sorted(merged.values())
+
+
+class _Rollup:
+    """Running aggregate of the samples falling into one bucket"""
+
+    __slots__ = ("bucket", "samples", "sums", "cpu_usage_max", "temperature_max")
+
+    def __init__(self, bucket: int) -> None:
+        self.bucket = bucket
+        self.samples = 0
+        self.sums = [0.0, 0.0, 0.0, 0.0, 0.0]
+        self.cpu_usage_max = 0.0
+        self.temperature_max = 0.0
+
+    def add(self, point: MetricPoint) -> None:
+        self.samples += 1
+        self.sums[0] += point.uptime
+        self.sums[1] += point.cpu_usage
+        self.sums[2] += point.memory_usage
+        self.sums[3] += point.disk_usage
+        self.sums[4] += point.temperature
+        self.cpu_usage_max = max(self.cpu_usage_max, point.cpu_usage)
+        self.temperature_max = max(self.temperature_max, point.temperature)
+
+    def point(self) -> MetricPoint:
+        uptime, cpu_usage, memory_usage, disk_usage, temperature = (
+            total / self.samples for total in self.sums
+        )
+        return MetricPoint(
+            self.bucket,
+            self.samples,
+            uptime,
+            cpu_usage,
+            memory_usage,
+            disk_usage,
+            temperature,
+            self.cpu_usage_max,
+            self.temperature_max,
+        )
+
+
+class _ClientHistory:
+    __slots__ = ("raw", "rollups")
+
+    def __init__(self, buffer_size: int) -> None:
+        self.raw: deque[MetricPoint] = deque(maxlen=buffer_size)
+        self.rollups: dict[int, _Rollup] = {}
+
+
+class MetricHistory:
+    """Append-only metric history with 1-minute and 1-hour rollups
+
+    Recording a sample is O(1): it goes into the client's in-memory ring
+    buffer and into one running aggregate per rollup resolution. Raw
+    samples and closed rollup buckets are queued and written in one batch
+    per flush interval, merged into the stored row of their bucket if
+    there is one; old rows are pruned per resolution.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = settings.metric_history_buffer,
+        flush_interval: float = settings.metric_history_flush_interval,
+    ) -> None:
+        self._buffer_size = buffer_size
+        self._flush_interval = flush_interval
+        self._clients: dict[str, _ClientHistory] = {}
+        self._pending: list[dict[str, Any]] = []
+        self._retention = {
+            RESOLUTIONS["raw"]: settings.metric_retention_raw,
+            RESOLUTIONS["1m"]: settings.metric_retention_minute,
+            RESOLUTIONS["1h"]: settings.metric_retention_hour,
+        }
+        self._last_prune = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    def record(self, name: str, data: MetricData) -> None:
+        point = MetricPoint(
+            int(get_time()),
+            1,
+            data.uptime,
+            data.cpu_usage,
+            data.memory_usage,
+            data.disk_usage,
+            data.temperature,
+            data.cpu_usage,
+            data.temperature,
+        )
+        history = self._clients.get(name)
+        if history is None:
+            history = self._clients[name] = _ClientHistory(self._buffer_size)
+        history.raw.append(point)
+        self._pending.append(point.to_row(name, RESOLUTIONS["raw"]))
+
+        for resolution in (RESOLUTIONS["1m"], RESOLUTIONS["1h"]):
+            bucket = point.timestamp - point.timestamp % resolution
+            rollup = history.rollups.get(resolution)
+            if rollup is None or rollup.bucket != bucket:
+                if rollup is not None:
+                    self._pending.append(rollup.point().to_row(name, resolution))
+                rollup = history.rollups[resolution] = _Rollup(bucket)
+            rollup.add(point)
+
+    def _unflushed(
+        self, name: str, resolution: int, start: int, end: int
+    ) -> list[MetricPoint]:
+        points = [
+            MetricPoint.from_row(row)
+            for row in self._pending
+            if row["name"] == name and row["resolution"] == resolution
+        ]
+        history = self._clients.get(name)
+        if resolution and history and (rollup := history.rollups.get(resolution)):
+            points.append(rollup.point())
+        return [point for point in points if start <= point.timestamp <= end]
+
+    async def query(
+        self, name: str, resolution: int, start: int, end: int
+    ) -> list[MetricPoint]:
+        history = self._clients.get(name)
+        if (
+            resolution == RESOLUTIONS["raw"]
+            and history
+            and history.raw
+            and history.raw[0].timestamp <= start
+        ):
+            # The whole range is still in the ring buffer
+            return [p for p in history.raw if start <= p.timestamp <= end]
+
+        db_session = await open_db_session()
+        try:
+            result = await db_session.execute(
+                select(MetricSample)
+                .where(
+                    MetricSample.name == name,
+                    MetricSample.resolution == resolution,
+                    MetricSample.timestamp.between(start, end),
+                )
+                .order_by(MetricSample.timestamp)
+            )
+            points = [MetricPoint.from_row(sample) for sample in result.scalars()]
+        finally:
+            await db_session.close()
+        # A bucket open in memory may also have been stored before a restart
+        return merge_points(points + self._unflushed(name, resolution, start, end))
+
+    @staticmethod
+    def _upsert() -> Any:
+        """INSERT merging a row into the stored row of the same bucket
+
+        A rollup bucket still open on shutdown is stored, and stored again
+        with the samples received after the restart.
+        """
+        stmt = upsert(MetricSample)
+        table, excluded = MetricSample.__table__.c, stmt.excluded
+        samples = table.samples + excluded.samples
+        merged: dict[str, Any] = {"samples": samples}
+        for field in MEAN_FIELDS:
+            merged[field] = (
+                table[field] * table.samples + excluded[field] * excluded.samples
+            ) / samples
+        for field in MAX_FIELDS:
+            merged[field] = case(
+                (excluded[field] > table[field], excluded[field]), else_=table[field]
+            )
+        return stmt.on_conflict_do_update(
+            index_elements=[
+                MetricSample.name,
+                MetricSample.resolution,
+                MetricSample.timestamp,
+            ],
+            set_=merged,
+        )
+
+    async def flush(self) -> None:
+        rows, self._pending = self._pending, []
+        if rows:
+            # One statement may not update the same row twice
+            buckets: dict[tuple[str, int, int], MetricPoint] = {}
+            for row in rows:
+                key = (row["name"], row["resolution"], row["timestamp"])
+                point = MetricPoint.from_row(row)
+                buckets[key] = buckets[key].merge(point) if key in buckets else point
+            db_session = await open_write_session()
+            try:
+                await db_session.execute(
+                    self._upsert(),
+                    [
+                        point.to_row(name, resolution)
+                        for (name, resolution, _), point in buckets.items()
+                    ],
+                )
+                await db_session.commit()
+            except Exception:
+                self._pending = rows + self._pending
+                raise
+            finally:
+                await db_session.close()
+
+        if time.monotonic() - self._last_prune >= settings.metric_prune_interval:
+            await self.prune()
+
+    async def prune(self) -> None:
+        now = int(get_time())
+        db_session = await open_write_session()
+        try:
+            await db_session.execute(
+                delete(MetricSample).where(
+                    or_(
+                        *(
+                            and_(
+                                MetricSample.resolution == resolution,
+                                MetricSample.timestamp < now - retention,
+                            )
+                            for resolution, retention in self._retention.items()
+                        )
+                    )
+                )
+            )
+            await db_session.commit()
+        finally:
+            await db_session.close()
+        self._last_prune = time.monotonic()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to flush metric history")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Persist the partial buckets too, so a restart does not lose them;
+        # after the restart the rest of the bucket is merged into the row
+        for name, history in self._clients.items():
+            for resolution, rollup in history.rollups.items():
+                self._pending.append(rollup.point().to_row(name, resolution))
+            history.rollups.clear()
+        await self.flush()
+
+
+metric_history = MetricHistory()
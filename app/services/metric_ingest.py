@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.database import open_write_session, upsert
+from app.models.metric import Metric
+from app.schemas.client import MetricData
+from app.services.client_registry import client_registry
+from app.utils.logger import logger
+
+METRIC_FIELDS = ("uptime", "cpu_usage", "memory_usage", "disk_usage", "temperature")
+
+
+class MetricQueueFullError(Exception):
+    """Raised when the ingest queue is full and the sample is shed."""
+
+
+class MetricIngestor:
+    """Queues metric uploads and writes the latest sample per client in batches
+
+    `submit` only validates and enqueues, so the request returns without
+    touching the database. Every flush interval the writer drains the
+    queue, keeps the newest sample per client and applies all of them in
+    one transaction with a single executemany upsert.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = settings.metric_queue_size,
+        flush_interval: float = settings.metric_flush_interval,
+    ) -> None:
+        self._queue: asyncio.Queue[tuple[str, MetricData]] = asyncio.Queue(queue_size)
+        self._flush_interval = flush_interval
+        self._task: asyncio.Task[None] | None = None
+        self.accepted = 0
+        self.shed = 0
+        self.flushed = 0
+        self.last_batch_size = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.maxsize
+
+    def submit(self, name: str, data: MetricData) -> None:
+        try:
+            self._queue.put_nowait((name, data))
+        except asyncio.QueueFull as exc:
+            self.shed += 1
+            raise MetricQueueFullError("Metric queue is full") from exc
+        self.accepted += 1
+
+    async def flush(self) -> None:
+        latest: dict[str, MetricData] = {}
+        while not self._queue.empty():
+            name, data = self._queue.get_nowait()
+            latest[name] = data
+        # Clients deleted since their upload no longer have an order row
+        rows = [
+            {"name": name, **{f: int(getattr(data, f)) for f in METRIC_FIELDS}}
+            for name, data in latest.items()
+            if name in client_registry
+        ]
+        if not rows:
+            return
+
+        started = time.perf_counter()
+        stmt = upsert(Metric)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Metric.name],
+            set_={f: stmt.excluded[f] for f in METRIC_FIELDS},
+        )
+        try:
+            # New clients have to reach the order table before their metric row
+            await client_registry.flush()
+            db_session = await open_write_session()
+            try:
+                await db_session.execute(stmt, rows)
+                await db_session.commit()
+            finally:
+                await db_session.close()
+        except Exception:
+            self._requeue(latest)
+            raise
+
+        elapsed = time.perf_counter() - started
+        self.flushed += len(rows)
+        self.last_batch_size = len(rows)
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+    def _requeue(self, latest: dict[str, MetricData]) -> None:
+        """Put a failed batch back, samples queued meanwhile are newer"""
+        while not self._queue.empty():
+            name, data = self._queue.get_nowait()
+            latest[name] = data
+        for name, data in latest.items():
+            try:
+                self._queue.put_nowait((name, data))
+            except asyncio.QueueFull:
+                self.shed += 1
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception("Failed to flush metrics")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+metric_ingestor = MetricIngestor()
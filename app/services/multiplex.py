@@ -0,0 +1,223 @@
+import asyncio
+import struct
+from enum import IntEnum
+from typing import Callable
+
+from app.services.relay import ChunkCallback
+
+# stream id, frame type, payload length
+FRAME_HEADER = struct.Struct("!IBI")
+WINDOW_UPDATE = struct.Struct("!I")
+
+
+class FrameType(IntEnum):
+    OPEN = 1
+    DATA = 2
+    FIN = 3
+    RESET = 4
+    WINDOW = 5
+
+
+class MultiplexError(Exception):
+    """Raised when the client breaks the multiplexing protocol."""
+
+
+class MuxStream:
+    """One operator connection carried over the back-connection
+
+    `send_credit` is how many bytes may still be sent to the client and
+    `receive_credit` how many the client may still send; both start at the
+    stream window and are replenished by WINDOW frames.
+    """
+
+    def __init__(
+        self,
+        stream_id: int,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        window: int,
+    ) -> None:
+        self.id = stream_id
+        self.reader = reader
+        self.writer = writer
+        self.send_credit = window
+        self.receive_credit = window
+        self.credit_available = asyncio.Event()
+        self.credit_available.set()
+        self.inbound: asyncio.Queue[bytes | None] = asyncio.Queue()
+        self.tasks: list[asyncio.Task[None]] = []
+
+    def grant(self, size: int) -> None:
+        self.send_credit += size
+        self.credit_available.set()
+
+    def abort(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+
+class Multiplexer:
+    """Carries many operator connections over one client back-connection
+
+    Every frame is a 9 byte header (stream id, type, payload length) and
+    its payload. The server sends OPEN for each accepted operator
+    connection, with the stream window as payload, and the client connects
+    it to its local service. DATA frames carry the bytes of one stream,
+    FIN ends one direction of a stream and RESET aborts it. A side never
+    sends more DATA than the window it was granted; the receiver returns
+    credit with WINDOW frames once the data left its buffers, so a slow
+    operator only stalls its own stream and never the back-connection.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        window: int,
+        max_frame: int,
+        max_streams: int,
+        on_sent: ChunkCallback,
+        on_received: ChunkCallback,
+        log: Callable[[str], None],
+    ) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._window = window
+        self._max_frame = max_frame
+        self._max_streams = max_streams
+        self._on_sent = on_sent
+        self._on_received = on_received
+        self._log = log
+        self._streams: dict[int, MuxStream] = {}
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def _send(
+        self, stream_id: int, frame_type: FrameType, payload: bytes = b""
+    ) -> None:
+        # Header and payload go out without an await in between, so frames
+        # of different streams never interleave
+        self._writer.write(FRAME_HEADER.pack(stream_id, frame_type, len(payload)))
+        if payload:
+            self._writer.write(payload)
+
+    async def run(self) -> None:
+        """Dispatch frames from the client until the back-connection closes"""
+        try:
+            while True:
+                stream_id, frame_type, size = FRAME_HEADER.unpack(
+                    await self._reader.readexactly(FRAME_HEADER.size)
+                )
+                self._check_frame(stream_id, frame_type, size)
+                payload = await self._reader.readexactly(size) if size else b""
+                await self._dispatch(stream_id, frame_type, payload)
+        except asyncio.IncompleteReadError:
+            self._log("back-connection closed")
+
+    def _check_frame(self, stream_id: int, frame_type: int, size: int) -> None:
+        """Reject a frame by its header, before its payload is read"""
+        if size > self._max_frame:
+            raise MultiplexError(f"frame of {size} bytes exceeds {self._max_frame}")
+        if frame_type == FrameType.WINDOW and size != WINDOW_UPDATE.size:
+            raise MultiplexError(f"window update of {size} bytes")
+        stream = self._streams.get(stream_id)
+        if frame_type == FrameType.DATA and stream and size > stream.receive_credit:
+            raise MultiplexError(f"stream {stream_id} exceeded its window")
+
+    async def _dispatch(self, stream_id: int, frame_type: int, payload: bytes) -> None:
+        stream = self._streams.get(stream_id)
+        if frame_type == FrameType.DATA:
+            if stream is None:
+                # Late data of a stream that was already closed here
+                return
+            stream.receive_credit -= len(payload)
+            stream.inbound.put_nowait(payload)
+            if pause := self._on_received(len(payload)):
+                await asyncio.sleep(pause)
+        elif frame_type == FrameType.WINDOW:
+            if stream is not None:
+                stream.grant(WINDOW_UPDATE.unpack(payload)[0])
+        elif frame_type == FrameType.FIN:
+            if stream is not None:
+                stream.inbound.put_nowait(None)
+        elif frame_type == FrameType.RESET:
+            if stream is not None:
+                stream.abort()
+        elif frame_type == FrameType.OPEN:
+            # Only the server opens streams
+            self._send(stream_id, FrameType.RESET)
+        else:
+            raise MultiplexError(f"unknown frame type {frame_type}")
+
+    async def open_stream(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Relay one operator connection until both directions finished"""
+        if len(self._streams) >= self._max_streams:
+            self._log(f"stream limit of {self._max_streams} reached, refused")
+            writer.close()
+            return
+
+        stream = MuxStream(self._next_id, reader, writer, self._window)
+        self._next_id += 1
+        self._streams[stream.id] = stream
+        self._log(f"stream {stream.id} opened from {writer.get_extra_info('peername')}")
+        self._send(stream.id, FrameType.OPEN, WINDOW_UPDATE.pack(self._window))
+        stream.tasks = [
+            asyncio.create_task(self._pump(stream)),
+            asyncio.create_task(self._deliver(stream)),
+        ]
+        results = await asyncio.gather(*stream.tasks, return_exceptions=True)
+        del self._streams[stream.id]
+        if any(isinstance(result, BaseException) for result in results):
+            stream.abort()
+            self._send(stream.id, FrameType.RESET)
+            self._log(f"stream {stream.id} reset")
+        else:
+            self._log(f"stream {stream.id} closed")
+        writer.close()
+
+    async def _pump(self, stream: MuxStream) -> None:
+        """Operator -> client, never beyond the credit the client granted"""
+        while True:
+            if stream.send_credit <= 0:
+                stream.credit_available.clear()
+                await stream.credit_available.wait()
+                continue
+            data = await stream.reader.read(min(stream.send_credit, self._max_frame))
+            if not data:
+                self._send(stream.id, FrameType.FIN)
+                return
+            stream.send_credit -= len(data)
+            pause = self._on_sent(len(data))
+            self._send(stream.id, FrameType.DATA, data)
+            await self._writer.drain()
+            if pause:
+                await asyncio.sleep(pause)
+
+    async def _deliver(self, stream: MuxStream) -> None:
+        """Client -> operator, returning credit once the data is written out"""
+        consumed = 0
+        while True:
+            data = await stream.inbound.get()
+            if data is None:
+                try:
+                    stream.writer.write_eof()
+                except OSError:
+                    pass
+                return
+            stream.writer.write(data)
+            await stream.writer.drain()
+            consumed += len(data)
+            # Batch credit while more data is queued
+            if stream.inbound.empty() or consumed >= self._window // 2:
+                stream.receive_credit += consumed
+                self._send(stream.id, FrameType.WINDOW, WINDOW_UPDATE.pack(consumed))
+                consumed = 0
+
+    def close(self) -> None:
+        """Abort all streams; their operator connections close on their own"""
+        for stream in list(self._streams.values()):
+            stream.abort()
@@ -0,0 +1,85 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable
+
+from app.core.config import settings
+
+ConnectionHandler = Callable[
+    [asyncio.StreamReader, asyncio.StreamWriter], Awaitable[None]
+]
+
+
+class PortPoolExhaustedError(Exception):
+    """Raised when no port of the configured range can be bound."""
+
+
+class PortPool:
+    """Leases listening ports from a fixed range
+
+    Free ports are kept in a FIFO free-list, so leasing and releasing are
+    O(1) and recently released ports are reused last. A lease binds the
+    server itself and hands it to the caller, so there is no window between
+    checking a port and binding it. Ports that fail to bind (taken by
+    another process) go to the back of the list and are retried later.
+    Ports in `reserved` are known to be held by another worker and are
+    skipped without a bind attempt.
+    """
+
+    def __init__(self, port_start: int, port_end: int, local_address: str) -> None:
+        self._local_address = local_address
+        self._free: deque[int] = deque(range(port_start, port_end + 1))
+        self._leased: set[int] = set()
+        self.reserved: set[int] = set()
+        self.size = len(self._free)
+        self.bind_failures = 0
+        self.exhausted = 0
+
+    @property
+    def leased(self) -> int:
+        return len(self._leased)
+
+    @property
+    def available(self) -> int:
+        """Free ports that are not held by another worker"""
+        return sum(port not in self.reserved for port in self._free)
+
+    async def lease(self, handler: ConnectionHandler) -> tuple[asyncio.Server, int]:
+        # Concurrent leases pop from the same list while this one waits for
+        # a bind, so it can run dry before every port was tried
+        attempts = len(self._free)
+        while self._free and attempts:
+            attempts -= 1
+            port = self._free.popleft()
+            if port in self.reserved:
+                self._free.append(port)
+                continue
+            try:
+                server = await asyncio.start_server(handler, self._local_address, port)
+            except OSError:
+                self.bind_failures += 1
+                self._free.append(port)
+                continue
+            self._leased.add(port)
+            return server, port
+
+        self.exhausted += 1
+        raise PortPoolExhaustedError(
+            f"Port pool exhausted: {self.leased} of {self.size} ports in use"
+        )
+
+    def release(self, port: int) -> None:
+        if port in self._leased:
+            self._leased.remove(port)
+            self._free.append(port)
+
+    async def close(self, server: asyncio.Server, port: int) -> None:
+        # The port is free again as soon as the listening socket is closed,
+        # even while accepted connections are still draining.
+        server.close()
+        self.release(port)
+        await server.wait_closed()
+
+
+port_pool = PortPool(
+    settings.port_range_start, settings.port_range_end, settings.local_address
+)
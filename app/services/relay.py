@@ -0,0 +1,263 @@
+import asyncio
+import os
+import socket
+from abc import ABC, abstractmethod
+from typing import Callable, Generic, TypeVar, cast
+
+from app.core.config import settings
+
+# Called with the size of every relayed chunk, returns how many seconds to
+# pause before reading the next one, if any
+ChunkCallback = Callable[[int], float | None]
+
+_SPLICE_FLAGS = getattr(os, "SPLICE_F_MOVE", 0) | getattr(os, "SPLICE_F_NONBLOCK", 0)
+
+
+class RelayUnavailableError(Exception):
+    """Raised when an engine cannot take over a connection pair."""
+
+
+class StreamEndpoint:
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    def shutdown_write(self) -> None:
+        try:
+            self.writer.write_eof()
+        except (AttributeError, OSError, RuntimeError):
+            pass
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+class SocketEndpoint:
+    def __init__(self, sock: socket.socket, pending: bytes = b"") -> None:
+        self.sock = sock
+        self.pending = pending
+
+    def shutdown_write(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    async def close(self) -> None:
+        self.sock.close()
+
+
+RelayEndpoint = StreamEndpoint | SocketEndpoint
+EndpointT = TypeVar("EndpointT", StreamEndpoint, SocketEndpoint)
+StreamPair = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class RelayEngine(ABC, Generic[EndpointT]):
+    name = ""
+
+    def __init__(self, buffer_size: int) -> None:
+        self._buffer_size = buffer_size
+
+    def supports(self, writer: asyncio.StreamWriter) -> bool:
+        return True
+
+    @abstractmethod
+    async def open(
+        self, source: StreamPair, target: StreamPair
+    ) -> tuple[EndpointT, EndpointT]:
+        """Take over both sides of a connection before relaying starts"""
+
+    @abstractmethod
+    async def relay(
+        self, source: EndpointT, target: EndpointT, on_chunk: ChunkCallback
+    ) -> None:
+        """Copy data from source to target until source reaches EOF"""
+
+
+class StreamRelayEngine(RelayEngine[StreamEndpoint]):
+    name = "stream"
+
+    async def open(
+        self, source: StreamPair, target: StreamPair
+    ) -> tuple[StreamEndpoint, StreamEndpoint]:
+        return StreamEndpoint(*source), StreamEndpoint(*target)
+
+    async def relay(
+        self, source: StreamEndpoint, target: StreamEndpoint, on_chunk: ChunkCallback
+    ) -> None:
+        while True:
+            data = await source.reader.read(self._buffer_size)
+            if not data:
+                return
+            pause = on_chunk(len(data))
+            target.writer.write(data)
+            await target.writer.drain()
+            if pause:
+                await asyncio.sleep(pause)
+
+
+class _DetachedSocketEngine(RelayEngine[SocketEndpoint]):
+    """Base for engines that take the raw sockets away from their transports"""
+
+    def supports(self, writer: asyncio.StreamWriter) -> bool:
+        sock = writer.get_extra_info("socket")
+        return (
+            sock is not None
+            and sock.type == socket.SOCK_STREAM
+            and writer.get_extra_info("sslcontext") is None
+            and isinstance(writer.transport, asyncio.ReadTransport)
+        )
+
+    async def open(
+        self, source: StreamPair, target: StreamPair
+    ) -> tuple[SocketEndpoint, SocketEndpoint]:
+        # Duplicate both descriptors before touching either transport so a
+        # failure here leaves the streams intact for the fallback engine.
+        socks: list[socket.socket] = []
+        try:
+            for _, writer in (source, target):
+                fd = os.dup(writer.get_extra_info("socket").fileno())
+                socks.append(socket.socket(fileno=fd))
+        except OSError as exc:
+            for sock in socks:
+                sock.close()
+            raise RelayUnavailableError(str(exc)) from exc
+
+        endpoints = []
+        for sock, (reader, writer) in zip(socks, (source, target)):
+            sock.setblocking(False)
+            endpoints.append(SocketEndpoint(sock, await self._detach(reader, writer)))
+        return endpoints[0], endpoints[1]
+
+    @staticmethod
+    async def _detach(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> bytes:
+        """Stop the transport and return whatever it already buffered"""
+        transport = cast(asyncio.Transport, writer.transport)
+        transport.pause_reading()
+        reader.feed_eof()
+        pending = await reader.read()
+        transport.close()
+        return pending
+
+
+class SocketRelayEngine(_DetachedSocketEngine):
+    name = "socket"
+
+    async def relay(
+        self, source: SocketEndpoint, target: SocketEndpoint, on_chunk: ChunkCallback
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        if source.pending:
+            pause = on_chunk(len(source.pending))
+            await loop.sock_sendall(target.sock, source.pending)
+            if pause:
+                await asyncio.sleep(pause)
+
+        buffer = bytearray(self._buffer_size)
+        view = memoryview(buffer)
+        while True:
+            size = await loop.sock_recv_into(source.sock, buffer)
+            if not size:
+                return
+            pause = on_chunk(size)
+            await loop.sock_sendall(target.sock, view[:size])
+            if pause:
+                await asyncio.sleep(pause)
+
+
+class SpliceRelayEngine(_DetachedSocketEngine):
+    """Moves data socket -> pipe -> socket inside the kernel (Linux only)"""
+
+    name = "splice"
+
+    def supports(self, writer: asyncio.StreamWriter) -> bool:
+        return hasattr(os, "splice") and super().supports(writer)
+
+    async def relay(
+        self, source: SocketEndpoint, target: SocketEndpoint, on_chunk: ChunkCallback
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        if source.pending:
+            pause = on_chunk(len(source.pending))
+            await loop.sock_sendall(target.sock, source.pending)
+            if pause:
+                await asyncio.sleep(pause)
+
+        source_fd = source.sock.fileno()
+        target_fd = target.sock.fileno()
+        pipe_read, pipe_write = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        try:
+            while True:
+                size = await _splice(
+                    source_fd, pipe_write, self._buffer_size, wait_writable=False
+                )
+                if not size:
+                    return
+                pause = on_chunk(size)
+                remaining = size
+                while remaining:
+                    remaining -= await _splice(
+                        pipe_read, target_fd, remaining, wait_writable=True
+                    )
+                if pause:
+                    await asyncio.sleep(pause)
+        finally:
+            os.close(pipe_read)
+            os.close(pipe_write)
+
+
+async def _splice(fd_in: int, fd_out: int, count: int, wait_writable: bool) -> int:
+    """Splice between a socket and a pipe, parking on the socket when it blocks"""
+    loop = asyncio.get_running_loop()
+    # The pipe is always drained before the next read, so only the socket
+    # side can be the reason for EAGAIN.
+    socket_fd = fd_out if wait_writable else fd_in
+    while True:
+        try:
+            return os.splice(fd_in, fd_out, count, flags=_SPLICE_FLAGS)
+        except BlockingIOError:
+            pass
+
+        ready: asyncio.Future[None] = loop.create_future()
+        if wait_writable:
+            loop.add_writer(socket_fd, _set_ready, ready)
+        else:
+            loop.add_reader(socket_fd, _set_ready, ready)
+        try:
+            await ready
+        finally:
+            if wait_writable:
+                loop.remove_writer(socket_fd)
+            else:
+                loop.remove_reader(socket_fd)
+
+
+def _set_ready(future: asyncio.Future[None]) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+ENGINE_PRIORITY: tuple[str, ...] = ("splice", "socket", "stream")
+
+_ENGINES: dict[str, type[RelayEngine]] = {
+    "splice": SpliceRelayEngine,
+    "socket": SocketRelayEngine,
+    "stream": StreamRelayEngine,
+}
+
+
+def get_relay_engines(
+    preference: str = settings.relay_engine,
+    buffer_size: int = settings.relay_buffer_size,
+) -> list[RelayEngine]:
+    """Engines to try in order, starting from the configured preference"""
+    start = 0 if preference == "auto" else ENGINE_PRIORITY.index(preference)
+    return [_ENGINES[name](buffer_size) for name in ENGINE_PRIORITY[start:]]
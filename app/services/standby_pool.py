@@ -0,0 +1,208 @@
+import asyncio
+import time
+from collections import deque
+
+from app.core.config import settings
+from app.core.security import client_tokens
+from app.services.relay import StreamPair
+from app.utils.logger import logger
+
+# readline raises ValueError when a line exceeds the stream limit
+LINE_ERRORS = (asyncio.TimeoutError, ConnectionError, ValueError)
+
+
+class StandbyConnection:
+    __slots__ = ("name", "reader", "writer", "parked_at", "keepalive")
+
+    def __init__(
+        self, name: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.name = name
+        self.reader = reader
+        self.writer = writer
+        self.parked_at = time.monotonic()
+        self.keepalive: asyncio.Task[None] | None = None
+
+
+class StandbyPool:
+    """Idle back-connections parked by clients, handed to new forwarders
+
+    Selected clients connect to `standby_port` ahead of time and park a
+    connection with a line based handshake:
+
+    - the client sends `HELLO <name>` (`HELLO <name> <token>` with a client
+      token), the server answers `OK`, or `BUSY` when a cap is reached and
+      `DENIED` when the client is not selected or its token does not match
+    - every `standby_keepalive_interval` the server sends `PING` and drops
+      the connection unless `PONG` comes back within the same interval;
+      connections older than `standby_max_age` get `CLOSE` and are
+      recycled, so the client parks a fresh one
+    - to use it, the server sends `CONNECT` (`CONNECT MUX` for a
+      multiplexed tunnel); the client connects its local service, answers
+      `READY` and from then on the connection is the tunnel
+
+    A forwarder that finds a parked connection starts relaying right away
+    instead of waiting for the client to poll its order and connect.
+    """
+
+    def __init__(
+        self,
+        port: int = settings.standby_port,
+        clients: str = settings.standby_clients,
+        max_per_client: int = settings.standby_max_per_client,
+        max_total: int = settings.standby_max_total,
+        keepalive_interval: float = settings.standby_keepalive_interval,
+        max_age: float = settings.standby_max_age,
+        handover_timeout: float = settings.standby_handover_timeout,
+    ) -> None:
+        self._port = port
+        self._clients = {name.strip() for name in clients.split(",") if name.strip()}
+        self._max_per_client = max_per_client
+        self._max_total = max_total
+        self._keepalive_interval = keepalive_interval
+        self._max_age = max_age
+        self._handover_timeout = handover_timeout
+        self._parked: dict[str, deque[StandbyConnection]] = {}
+        self._server: asyncio.Server | None = None
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.recycled = 0
+        self.expired = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._server is not None
+
+    @property
+    def parked(self) -> int:
+        return sum(len(connections) for connections in self._parked.values())
+
+    @property
+    def clients(self) -> int:
+        return len(self._parked)
+
+    def is_selected(self, name: str) -> bool:
+        return "*" in self._clients or name in self._clients
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            line = await asyncio.wait_for(reader.readline(), self._handover_timeout)
+        except LINE_ERRORS:
+            self.rejected += 1
+            writer.close()
+            return
+        command, _, name = line.decode(errors="replace").strip().partition(" ")
+        name, _, token = name.partition(" ")
+        if (
+            command != "HELLO"
+            or not name
+            or not self.is_selected(name)
+            or not client_tokens.check(name, token or None)
+        ):
+            writer.write(b"DENIED\n")
+            writer.close()
+            return
+
+        connections = self._parked.get(name, deque())
+        if len(connections) >= self._max_per_client or self.parked >= self._max_total:
+            self.rejected += 1
+            writer.write(b"BUSY\n")
+            writer.close()
+            return
+
+        connection = StandbyConnection(name, reader, writer)
+        self._parked[name] = connections
+        connections.append(connection)
+        writer.write(b"OK\n")
+        connection.keepalive = asyncio.create_task(self._keepalive(connection))
+
+    async def _keepalive(self, connection: StandbyConnection) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self._keepalive_interval)
+                if time.monotonic() - connection.parked_at >= self._max_age:
+                    connection.writer.write(b"CLOSE\n")
+                    self.recycled += 1
+                    break
+                connection.writer.write(b"PING\n")
+                line = await asyncio.wait_for(
+                    connection.reader.readline(), self._keepalive_interval
+                )
+                if line != b"PONG\n":
+                    self.expired += 1
+                    break
+        except LINE_ERRORS:
+            self.expired += 1
+        self._discard(connection)
+        connection.writer.close()
+
+    def _discard(self, connection: StandbyConnection) -> None:
+        connections = self._parked.get(connection.name)
+        if connections and connection in connections:
+            connections.remove(connection)
+            if not connections:
+                del self._parked[connection.name]
+
+    async def _handover(self, connection: StandbyConnection, multiplex: bool) -> bool:
+        connection.writer.write(b"CONNECT MUX\n" if multiplex else b"CONNECT\n")
+        try:
+            # A PONG to a PING sent just before may still be on its way
+            while (
+                line := await asyncio.wait_for(
+                    connection.reader.readline(), self._handover_timeout
+                )
+            ) == b"PONG\n":
+                pass
+        except LINE_ERRORS:
+            return False
+        return line == b"READY\n"
+
+    async def claim(self, name: str, multiplex: bool = False) -> StreamPair | None:
+        """Take a parked connection of the client, None on a miss"""
+        if self._server is None or not self.is_selected(name):
+            return None
+        while connections := self._parked.get(name):
+            connection = connections.pop()
+            if not connections:
+                del self._parked[name]
+            if connection.keepalive:
+                connection.keepalive.cancel()
+                await asyncio.gather(connection.keepalive, return_exceptions=True)
+            if await self._handover(connection, multiplex):
+                self.hits += 1
+                return connection.reader, connection.writer
+            self.expired += 1
+            connection.writer.close()
+        self.misses += 1
+        return None
+
+    async def start(self) -> None:
+        if not self._port:
+            return
+        self._server = await asyncio.start_server(
+            self._handle,
+            settings.local_address,
+            self._port,
+            # Let every worker accept standby connections on the same port
+            reuse_port=settings.forwarder_directory == "database",
+        )
+        logger.info("Accepting standby connections on port %s", self._port)
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for connections in list(self._parked.values()):
+            for connection in list(connections):
+                if connection.keepalive:
+                    connection.keepalive.cancel()
+                connection.writer.close()
+        self._parked.clear()
+        await self._server.wait_closed()
+        self._server = None
+
+
+standby_pool = StandbyPool()
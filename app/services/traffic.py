@@ -0,0 +1,83 @@
+import time
+
+
+def format_bytes(size: float) -> str:
+    if size < 1024:
+        return f"{size:.0f} B"
+    for unit in ("KiB", "MiB"):
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+    return f"{size / 1024:.1f} GiB"
+
+
+class DirectionCounters:
+    """Byte and chunk counters for one relay direction
+
+    `add` is called once per relayed chunk, so it only bumps two integers;
+    rates are derived when a summary is taken.
+    """
+
+    __slots__ = ("bytes", "packets", "peak_rate", "_reported_bytes")
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self.packets = 0
+        self.peak_rate = 0.0
+        self._reported_bytes = 0
+
+    def add(self, size: int) -> None:
+        self.bytes += size
+        self.packets += 1
+
+    def take_rate(self, elapsed: float) -> float:
+        """Rate since the previous call, updating the peak"""
+        rate = (self.bytes - self._reported_bytes) / elapsed if elapsed > 0 else 0.0
+        self._reported_bytes = self.bytes
+        self.peak_rate = max(self.peak_rate, rate)
+        return rate
+
+
+class TrafficCounters:
+    def __init__(self) -> None:
+        self._directions: dict[str, DirectionCounters] = {}
+        self._started = time.monotonic()
+        self._last_report = self._started
+        self._last_total = 0
+
+    def direction(self, name: str) -> DirectionCounters:
+        if name not in self._directions:
+            self._directions[name] = DirectionCounters()
+        return self._directions[name]
+
+    @property
+    def directions(self) -> dict[str, DirectionCounters]:
+        return self._directions
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(counters.bytes for counters in self._directions.values())
+
+    def summary(self, final: bool = False) -> str | None:
+        """Summarise traffic since the last summary, None if nothing moved"""
+        now = time.monotonic()
+        total = self.total_bytes
+        if total == self._last_total and not final:
+            return None
+
+        elapsed = now - self._last_report
+        parts = []
+        for name, counters in self._directions.items():
+            rate = counters.take_rate(elapsed)
+            if final:
+                rate = counters.bytes / max(now - self._started, 1e-9)
+            parts.append(
+                f"{name} {format_bytes(counters.bytes)} "
+                f"({counters.packets} chunks, {format_bytes(rate)}/s, "
+                f"peak {format_bytes(counters.peak_rate)}/s)"
+            )
+        self._last_report = now
+        self._last_total = total
+
+        label = "traffic total" if final else "traffic"
+        return f"{label}: " + " | ".join(parts) if parts else None
@@ -0,0 +1,66 @@
+import time
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.services.traffic import format_bytes
+
+
+@dataclass(frozen=True, slots=True)
+class TunnelPolicy:
+    """Limits of one relayed tunnel, a limit of 0 is disabled
+
+    `idle_timeout` and `max_lifetime` are seconds since the last relayed
+    byte and since the relay started, `bandwidth_limit` is bytes per second
+    in each direction.
+    """
+
+    idle_timeout: float = settings.tunnel_idle_timeout
+    max_lifetime: float = settings.tunnel_max_lifetime
+    bandwidth_limit: int = settings.tunnel_bandwidth_limit
+
+    @property
+    def has_timeouts(self) -> bool:
+        return bool(self.idle_timeout or self.max_lifetime)
+
+    def describe(self) -> str | None:
+        parts = []
+        if self.idle_timeout:
+            parts.append(f"idle timeout {self.idle_timeout:g}s")
+        if self.max_lifetime:
+            parts.append(f"max lifetime {self.max_lifetime:g}s")
+        if self.bandwidth_limit:
+            parts.append(f"bandwidth {format_bytes(self.bandwidth_limit)}/s")
+        return ", ".join(parts) if parts else None
+
+
+class TokenBucket:
+    """Token bucket rate limiter that lets a chunk overdraw the bucket
+
+    `consume` is called once per relayed chunk, after the chunk was read,
+    and returns how long the caller should pause before reading the next
+    one. A chunk larger than the bucket still goes through and the debt is
+    paid by the pause, so the relay never has to split its reads. The
+    bucket holds one second worth of tokens.
+    """
+
+    __slots__ = ("rate", "_tokens", "_updated")
+
+    def __init__(self, rate: int) -> None:
+        self.rate = rate
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+
+    def consume(self, size: int) -> float:
+        now = time.monotonic()
+        tokens = self._tokens + (now - self._updated) * self.rate
+        self._tokens = min(tokens, self.rate) - size
+        self._updated = now
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+# Aggregate limit shared by every tunnel of this worker
+global_bandwidth: TokenBucket | None = (
+    TokenBucket(settings.tunnel_global_bandwidth_limit)
+    if settings.tunnel_global_bandwidth_limit
+    else None
+)
@@ -0,0 +1,54 @@
+"""Compare two `benchmarks.suite` result files number by number.
+
+uv run python -m benchmarks.compare before.json after.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any
+
+
+def flatten(results: dict[str, Any], prefix: str = "") -> dict[str, float]:
+    """Numeric leaves keyed by their dotted path, `meta` is skipped"""
+    values: dict[str, float] = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    args = parser.parse_args()
+
+    runs = [json.loads(path.read_text()) for path in (args.before, args.after)]
+    for run, path in zip(runs, (args.before, args.after)):
+        run_meta = run.get("meta", {})
+        print(f"{path}: {run_meta.get('version')} {run_meta.get('revision')}")
+
+    before, after = (
+        flatten({k: v for k, v in run.items() if k != "meta"}) for run in runs
+    )
+    width = max(map(len, before | after), default=0)
+    for key in sorted(before | after):
+        old, new = before.get(key), after.get(key)
+        change = ""
+        if old and new is not None:
+            change = f"{(new - old) / old * 100:+.1f}%"
+        print(f"{key:<{width}}  {_format(old):>12}  {_format(new):>12}  {change:>8}")
+
+
+def _format(value: float | None) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+if __name__ == "__main__":
+    main()
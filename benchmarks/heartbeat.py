@@ -0,0 +1,97 @@
+"""Compare the legacy order + metric poll cycle with the combined heartbeat.
+
+Runs the FastAPI app in-process over httpx's ASGI transport, so the numbers
+measure request handling only (no TLS, no network). The background flush
+loops are not started, which keeps the database out of the measurement.
+
+    uv run python -m benchmarks.heartbeat --clients 1000 --cycles 5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("MASTER_PASSWORD_HASH", "")
+os.environ.setdefault("ALLOWED_ORIGINS", "*")
+
+# pylint: disable=wrong-import-position
+import httpx
+
+from app.main import app
+from app.routers import client as client_router
+from app.services.metric_ingest import MetricIngestor
+
+METRIC = {
+    "uptime": 1000,
+    "cpuUsage": 12.5,
+    "memoryUsage": 40,
+    "diskUsage": 70,
+    "temperature": 45,
+}
+
+
+async def legacy_cycle(client: httpx.AsyncClient, name: str) -> int:
+    headers = {"name": name, "username": "bench"}
+    await client.get("/api/v1/client/order", headers=headers)
+    await client.put("/api/v1/client/metric", headers=headers, json=METRIC)
+    return 2
+
+
+async def heartbeat_cycle(client: httpx.AsyncClient, name: str) -> int:
+    headers = {"name": name, "username": "bench"}
+    await client.post("/api/v1/client/heartbeat", headers=headers, json=METRIC)
+    return 1
+
+
+Cycle = Callable[[httpx.AsyncClient, str], Awaitable[int]]
+
+
+async def run(cycle: Cycle, clients: int, cycles: int) -> dict[str, float]:
+    # The writer is not running, so size the queue to hold every sample
+    client_router.metric_ingestor = MetricIngestor(queue_size=clients * (cycles + 1))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        names = [f"bench-{i}" for i in range(clients)]
+        # Register every client once so both modes start from the same state
+        await asyncio.gather(*(heartbeat_cycle(client, name) for name in names))
+
+        requests = 0
+        started = time.perf_counter()
+        for _ in range(cycles):
+            requests += sum(
+                await asyncio.gather(*(cycle(client, name) for name in names))
+            )
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "seconds": elapsed,
+        "requests_per_second": requests / elapsed,
+        "client_cycles_per_second": clients * cycles / elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+
+    legacy = await run(legacy_cycle, args.clients, args.cycles)
+    combined = await run(heartbeat_cycle, args.clients, args.cycles)
+    for label, result in (("order + metric", legacy), ("heartbeat", combined)):
+        print(
+            f"{label:>15}: {result['requests_per_second']:9.0f} req/s "
+            f"{result['client_cycles_per_second']:9.0f} client cycles/s"
+        )
+    gain = combined["client_cycles_per_second"] / legacy["client_cycles_per_second"]
+    print(f"{'speedup':>15}: {gain:.2f}x client cycles/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,127 @@
+"""Load-test the client polling endpoints with thousands of simulated clients.
+
+The FastAPI app runs in-process over httpx's ASGI transport with its full
+lifespan (registry flushes, metric writer, ...) against a throwaway SQLite
+database, unless `DATABASE_URL` points elsewhere. Every client registers,
+then runs `--cycles` rounds of `GET /client/order` + `PUT /client/metric`,
+all clients concurrently. Latencies are measured per request.
+
+    uv run python -m benchmarks.polling --clients 5000 --cycles 5
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+_DB_DIR: str | None = None
+if "DATABASE_URL" not in os.environ:
+    _DB_DIR = tempfile.mkdtemp(prefix="backchannel-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{Path(_DB_DIR) / 'bench.db'}"
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("MASTER_PASSWORD_HASH", "")
+os.environ.setdefault("ALLOWED_ORIGINS", "*")
+# Keep metric shedding out of the latency numbers
+os.environ.setdefault("METRIC_QUEUE_SIZE", "1000000")
+
+# pylint: disable=wrong-import-position
+import httpx
+
+from app.main import app, lifespan
+
+METRIC = {
+    "uptime": 1000,
+    "cpuUsage": 12.5,
+    "memoryUsage": 40,
+    "diskUsage": 70,
+    "temperature": 45,
+}
+
+
+async def client_cycles(
+    client: httpx.AsyncClient, name: str, cycles: int, latencies: list[float]
+) -> int:
+    """Run the poll cycles of one client, returns the number of failed requests"""
+    headers = {"name": name, "username": "bench"}
+    errors = 0
+    for _ in range(cycles):
+        for method, url, body in (
+            ("GET", "/api/v1/client/order", None),
+            ("PUT", "/api/v1/client/metric", METRIC),
+        ):
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=headers, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+    return errors
+
+
+def percentiles(latencies: list[float]) -> dict[str, float]:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50": cuts[49] * 1000,
+        "p90": cuts[89] * 1000,
+        "p99": cuts[98] * 1000,
+        "max": max(latencies) * 1000,
+    }
+
+
+async def run(clients: int, cycles: int) -> dict[str, Any]:
+    names = [f"bench-{i}" for i in range(clients)]
+    latencies: list[float] = []
+    async with lifespan(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            # Register every client first, like clients that are already online
+            await asyncio.gather(*(client_cycles(client, n, 1, []) for n in names))
+
+            started = time.perf_counter()
+            errors = sum(
+                await asyncio.gather(
+                    *(client_cycles(client, n, cycles, latencies) for n in names)
+                )
+            )
+            elapsed = time.perf_counter() - started
+
+    return {
+        "clients": clients,
+        "cycles": cycles,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def cleanup() -> None:
+    if _DB_DIR:
+        shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        result = await run(args.clients, args.cycles)
+    finally:
+        cleanup()
+    latency = result["latency_ms"]
+    print(
+        f"{result['requests_per_second']:.0f} req/s, {result['errors']} errors, "
+        f"p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+"""Measure `Forwarder.relay` throughput and CPU cost per engine over loopback.
+
+A child process plays both ends of a tunnel: it streams `--size` MiB into
+the source connection and drains the target connection. The benchmark
+process only runs the relay, so its CPU time is the relay's cost.
+
+    uv run python -m benchmarks.relay --size 1024
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Any
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("MASTER_PASSWORD_HASH", "")
+os.environ.setdefault("ALLOWED_ORIGINS", "*")
+
+# pylint: disable=wrong-import-position
+from app.core.config import settings
+from app.services.forwarder import Forwarder
+from app.services.relay import (
+    ENGINE_PRIORITY,
+    RelayEngine,
+    StreamPair,
+    get_relay_engines,
+)
+
+MIB = 1024 * 1024
+GIB = 1024 * MIB
+
+
+def load_generator(source_port: int, target_port: int, size: int) -> None:
+    """Send `size` bytes through the tunnel and read them back out"""
+    source = socket.create_connection(("127.0.0.1", source_port))
+    target = socket.create_connection(("127.0.0.1", target_port))
+
+    def drain() -> None:
+        while target.recv(MIB):
+            pass
+
+    reader = threading.Thread(target=drain)
+    reader.start()
+    chunk = bytes(MIB)
+    for _ in range(size // MIB):
+        source.sendall(chunk)
+    source.shutdown(socket.SHUT_WR)
+    reader.join()
+    source.close()
+    target.close()
+
+
+async def accept_pair() -> tuple[asyncio.Server, asyncio.Future[StreamPair]]:
+    accepted: asyncio.Future[StreamPair] = asyncio.get_running_loop().create_future()
+
+    async def on_connect(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        accepted.set_result((reader, writer))
+
+    server = await asyncio.start_server(on_connect, "127.0.0.1", 0)
+    return server, accepted
+
+
+async def measure(
+    engine: RelayEngine, source: StreamPair, target: StreamPair
+) -> dict[str, Any]:
+    """Relay source to target until EOF, timing the wall clock and our CPU"""
+    source_endpoint, target_endpoint = await engine.open(source, target)
+    forwarder = Forwarder("bench", 0)
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    await forwarder.relay(engine, source_endpoint, target_endpoint, "bench")
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    for endpoint in (source_endpoint, target_endpoint):
+        await endpoint.close()
+
+    counters = forwarder.traffic.direction("bench")
+    return {
+        "bytes": counters.bytes,
+        "chunks": counters.packets,
+        "seconds": elapsed,
+        "mib_per_second": counters.bytes / MIB / elapsed,
+        "cpu_seconds": cpu,
+        "cpu_seconds_per_gib": cpu / (counters.bytes / GIB),
+    }
+
+
+async def run_engine(engine_name: str, size: int) -> dict[str, Any] | None:
+    engine = get_relay_engines(engine_name)[0]
+    source_server, source_accepted = await accept_pair()
+    target_server, target_accepted = await accept_pair()
+    process = multiprocessing.get_context("spawn").Process(
+        target=load_generator,
+        args=(
+            source_server.sockets[0].getsockname()[1],
+            target_server.sockets[0].getsockname()[1],
+            size,
+        ),
+    )
+    process.start()
+    try:
+        source = await source_accepted
+        target = await target_accepted
+        if not (engine.supports(source[1]) and engine.supports(target[1])):
+            for _, writer in (source, target):
+                writer.close()
+            return None
+        return await measure(engine, source, target)
+    finally:
+        await asyncio.to_thread(process.join)
+        source_server.close()
+        target_server.close()
+
+
+async def run(size: int, engines: list[str]) -> dict[str, Any]:
+    results: dict[str, Any] = {
+        "size_mib": size // MIB,
+        "buffer_size": settings.relay_buffer_size,
+    }
+    for name in engines:
+        if result := await run_engine(name, size):
+            results[name] = result
+    return results
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024, help="MiB to relay")
+    parser.add_argument(
+        "--engine", action="append", choices=ENGINE_PRIORITY, dest="engines"
+    )
+    args = parser.parse_args()
+
+    results = await run(args.size * MIB, args.engines or list(ENGINE_PRIORITY))
+    for name in ENGINE_PRIORITY:
+        if result := results.get(name):
+            print(
+                f"{name:>7}: {result['mib_per_second']:8.0f} MiB/s "
+                f"{result['cpu_seconds_per_gib']:6.2f} CPU s/GiB"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
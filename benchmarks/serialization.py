@@ -0,0 +1,146 @@
+"""Measure the encoding of a large `/manage/data` response.
+
+Every method turns the same rows, shaped like the columns the query
+returns, into the JSON body of the response:
+
+- "legacy" builds a ManageDataResponseItem per row, dumps the response to
+  a dict and encodes it with the stdlib `JSONResponse`
+- "model_dump_json" builds the same models and encodes them with pydantic
+- "response_class" builds the same models and hands them to the
+  `SchemaJSONResponse` default response class
+- "bulk" zips the rows with the field aliases and encodes them in one
+  `to_json` call, the path `/manage/data` takes
+
+    uv run python -m benchmarks.serialization --items 10000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Any, Callable
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("MASTER_PASSWORD_HASH", "")
+os.environ.setdefault("ALLOWED_ORIGINS", "*")
+
+# pylint: disable=wrong-import-position
+from fastapi.responses import JSONResponse
+from pydantic_core import to_json
+
+from app.core.responses import SchemaJSONResponse
+from app.schemas.manage import ManageDataResponse, ManageDataResponseItem
+
+Row = tuple[Any, ...]
+
+STATUSES = ("online", "stale", "offline")
+
+
+def make_rows(items: int) -> list[Row]:
+    rows: list[Row] = []
+    for i in range(items):
+        if i % 10 == 0:
+            # A client that never sent a metric
+            rows.append((f"client-{i:05d}", 1700000000 + i, "offline") + (None,) * 5)
+        else:
+            rows.append(
+                (
+                    f"client-{i:05d}",
+                    1700000000 + i,
+                    STATUSES[i % 3],
+                    i * 60,
+                    i % 100,
+                    (i * 7) % 100,
+                    (i * 13) % 100,
+                    30 + i % 40,
+                )
+            )
+    return rows
+
+
+def build_response(rows: list[Row]) -> ManageDataResponse:
+    resp = ManageDataResponse(total=len(rows))
+    for name, polled_time, status, *metric in rows:
+        resp_item = ManageDataResponseItem(
+            name=name,
+            polled_time=float(polled_time) if polled_time is not None else 0.0,
+            status=status,
+        )
+        if metric[0] is not None:
+            resp_item.uptime = metric[0]
+            resp_item.cpu_usage = metric[1]
+            resp_item.memory_usage = metric[2]
+            resp_item.disk_usage = metric[3]
+            resp_item.temperature = metric[4]
+        resp.data.append(resp_item)
+    return resp
+
+
+def legacy(rows: list[Row]) -> bytes:
+    return JSONResponse(build_response(rows).model_dump()).body
+
+
+def model_dump_json(rows: list[Row]) -> bytes:
+    return build_response(rows).model_dump_json().encode()
+
+
+def response_class(rows: list[Row]) -> bytes:
+    return SchemaJSONResponse(build_response(rows)).body
+
+
+def bulk(rows: list[Row]) -> bytes:
+    keys = ManageDataResponseItem.field_aliases()
+    items = []
+    for row in rows:
+        item = dict(zip(keys, row))
+        item["polledTime"] = float(item["polledTime"] or 0)
+        items.append(item)
+    return to_json({"data": items, "total": len(rows)})
+
+
+METHODS: dict[str, Callable[[list[Row]], bytes]] = {
+    "legacy": legacy,
+    "model_dump_json": model_dump_json,
+    "response_class": response_class,
+    "bulk": bulk,
+}
+
+
+def run(items: int, repeat: int) -> dict[str, Any]:
+    rows = make_rows(items)
+    expected = json.loads(legacy(rows))
+    results: dict[str, Any] = {"items": items, "repeat": repeat}
+    for name, method in METHODS.items():
+        body = method(rows)
+        if json.loads(body) != expected:
+            raise AssertionError(f"{name} encodes a different response")
+        start = time.perf_counter()
+        for _ in range(repeat):
+            method(rows)
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "ms_per_response": round(elapsed / repeat * 1000, 3),
+            "bytes": len(body),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = run(args.items, args.repeat)
+    print(f"{args.items} items, averaged over {args.repeat} runs")
+    baseline = results["legacy"]["ms_per_response"]
+    for name in METHODS:
+        ms = results[name]["ms_per_response"]
+        print(
+            f"{name:>16}: {ms:8.2f} ms/response  "
+            f"{baseline / ms:5.1f}x  {results[name]['bytes']} bytes"
+        )
+
+
+if __name__ == "__main__":
+    main()
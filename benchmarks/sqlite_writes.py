@@ -0,0 +1,137 @@
+"""Measure SQLite write throughput of the old and the tuned database setup.
+
+"before" is the previous engine: one pool for everything, rollback journal
+and pool_pre_ping. "after" is the current setup: WAL with the tuned pragmas,
+a single serialized writer connection and a separate query-only read pool.
+Every writer task upserts its own client row in small transactions, like
+the per-request writes of the polling endpoints, while reader tasks keep
+querying the table at a fixed interval.
+
+    uv run python -m benchmarks.sqlite_writes --writers 50 --writes 200
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("MASTER_PASSWORD_HASH", "")
+os.environ.setdefault("ALLOWED_ORIGINS", "*")
+
+# pylint: disable=wrong-import-position
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.core.database import Base, create_read_engine, create_write_engine
+from app.models.order import Order
+
+
+def legacy_engines(url: str) -> tuple[AsyncEngine, AsyncEngine]:
+    engine = create_async_engine(
+        url, connect_args={"check_same_thread": False}, pool_pre_ping=True
+    )
+    return engine, engine
+
+
+def tuned_engines(url: str) -> tuple[AsyncEngine, AsyncEngine]:
+    return create_write_engine(url), create_read_engine(url)
+
+
+async def writer(engine: AsyncEngine, name: str, writes: int) -> tuple[int, int]:
+    done = errors = 0
+    for polled_time in range(writes):
+        stmt = insert(Order).values(
+            name=name, username="bench", polled_time=polled_time
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Order.name], set_={"polled_time": stmt.excluded.polled_time}
+        )
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(stmt)
+            done += 1
+        except OperationalError:
+            # "database is locked"
+            errors += 1
+    return done, errors
+
+
+async def reader(engine: AsyncEngine, stop: asyncio.Event, interval: float) -> int:
+    reads = 0
+    while not stop.is_set():
+        async with engine.connect() as conn:
+            await conn.execute(select(func.count()).select_from(Order))
+        reads += 1
+        await asyncio.sleep(interval)
+    return reads
+
+
+EngineFactory = Callable[[str], tuple[AsyncEngine, AsyncEngine]]
+
+
+async def run(
+    make_engines: EngineFactory, args: argparse.Namespace
+) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        write_engine, read_engine = make_engines(url)
+        async with write_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        stop = asyncio.Event()
+        readers = [
+            asyncio.create_task(reader(read_engine, stop, args.read_interval))
+            for _ in range(args.readers)
+        ]
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(
+                writer(write_engine, f"bench-{i}", args.writes)
+                for i in range(args.writers)
+            )
+        )
+        elapsed = time.perf_counter() - started
+        stop.set()
+        reads = sum(await asyncio.gather(*readers))
+
+        await read_engine.dispose()
+        await write_engine.dispose()
+
+    writes = sum(done for done, _ in results)
+    return {
+        "writes": writes,
+        "errors": sum(errors for _, errors in results),
+        "seconds": elapsed,
+        "writes_per_second": writes / elapsed,
+        "reads_per_second": reads / elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--read-interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    before = await run(legacy_engines, args)
+    after = await run(tuned_engines, args)
+    for label, result in (("before", before), ("after", after)):
+        print(
+            f"{label:>7}: {result['writes_per_second']:8.0f} writes/s "
+            f"{result['reads_per_second']:8.0f} reads/s "
+            f"{result['errors']:6.0f} lock errors"
+        )
+    gain = after["writes_per_second"] / before["writes_per_second"]
+    print(f"{'speedup':>7}: {gain:.2f}x writes/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
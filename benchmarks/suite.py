@@ -0,0 +1,82 @@
+"""Run the polling, relay and serialization benchmarks and write the results as JSON.
+
+The JSON carries the version, commit and machine it was taken on, so two
+runs can be lined up with `benchmarks.compare`.
+
+    uv run python -m benchmarks.suite --output results.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tomllib
+from pathlib import Path
+from typing import Any
+
+from benchmarks import polling, relay, serialization
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def meta() -> dict[str, Any]:
+    with open(ROOT / "pyproject.toml", "rb") as file:
+        version = tomllib.load(file)["project"]["version"]
+    return {
+        "version": version,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": datetime.datetime.now(datetime.UTC).isoformat(),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--size", type=int, default=1024, help="MiB to relay")
+    parser.add_argument(
+        "--items", type=int, default=10000, help="rows of the encoded response"
+    )
+    parser.add_argument("--output", type=Path, help="file to write, default stdout")
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {"meta": meta()}
+    try:
+        results["polling"] = await polling.run(args.clients, args.cycles)
+    finally:
+        polling.cleanup()
+    results["relay"] = await relay.run(
+        args.size * relay.MIB, list(relay.ENGINE_PRIORITY)
+    )
+    results["serialization"] = serialization.run(args.items, repeat=20)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
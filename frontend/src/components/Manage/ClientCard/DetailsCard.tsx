@@ -21,6 +21,9 @@ interface DetailsCardProps {
 const DetailsCard: React.FC<DetailsCardProps> = ({ client, isFlipped, onDelete, handleConnection, isConnected }) => {
 
   const isClientActive = () => {
+    if (client.status) {
+      return client.status === 'online';
+    }
     const now = Date.now() / 1000;
     const timeSinceLastPoll = now - client.polledTime;
     return timeSinceLastPoll < 60;
@@ -15,8 +15,8 @@ import {
 import { ExitToApp, Dashboard } from '@mui/icons-material';
 import { useNavigate } from 'react-router-dom';
 import ClientCard from './ClientCard/ClientCard.tsx';
-import { authService, manageService, ApiError } from '../../services';
-import type { ClientData } from '../../services/manageService';
+import { authService, manageService, applyFleetMessage, ApiError } from '../../services';
+import type { ClientData, FleetMessage } from '../../services/manageService';
 import logo from '../../../android-chrome-192x192.png';
 
 const Manage: React.FC = () => {
@@ -85,14 +85,32 @@ const Manage: React.FC = () => {
   };
 
   useEffect(() => {
-    fetchClients();
+    let intervalId: ReturnType<typeof setInterval> | undefined;
+    const eventSource = new EventSource('/api/v1/manage/stream', {
+      withCredentials: true
+    });
+
+    eventSource.onmessage = (event) => {
+      const message = JSON.parse(event.data) as FleetMessage;
+      setClients(prev => applyFleetMessage(prev, message));
+      setLoading(false);
+    };
 
-    const intervalId = setInterval(() => {
-      fetchClients();
-    }, 5000);
+    eventSource.onerror = () => {
+      // The browser reconnects by itself unless the stream was refused
+      if (eventSource.readyState === EventSource.CLOSED && !intervalId) {
+        fetchClients();
+        intervalId = setInterval(() => {
+          fetchClients();
+        }, 5000);
+      }
+    };
 
     return () => {
-      clearInterval(intervalId);
+      eventSource.close();
+      if (intervalId) {
+        clearInterval(intervalId);
+      }
     };
   }, [fetchClients]);
 
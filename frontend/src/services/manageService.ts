@@ -8,6 +8,7 @@ import { api } from './api';
 export interface ClientData {
   name: string;
   polledTime: number;
+  status?: 'online' | 'stale' | 'offline' | null;
   uptime?: number;
   cpuUsage?: number;
   memoryUsage?: number;
@@ -19,6 +20,45 @@ export interface ClientsResponse {
   data: ClientData[];
 }
 
+export type FleetMessage =
+  | { type: 'snapshot'; clients: ClientData[] }
+  | {
+      type: 'delta';
+      clients: (Partial<ClientData> & { name: string })[];
+      removed: string[];
+    };
+
+/**
+ * Apply a message of the /manage/stream fleet stream to the client list
+ */
+export const applyFleetMessage = (
+  clients: ClientData[],
+  message: FleetMessage
+): ClientData[] => {
+  if (message.type === 'snapshot') {
+    return message.clients;
+  }
+  const removed = new Set(message.removed);
+  const changes = new Map(message.clients.map((change) => [change.name, change]));
+  const next = clients
+    .filter((client) => !removed.has(client.name))
+    .map((client) => {
+      const change = changes.get(client.name);
+      if (!change) {
+        return client;
+      }
+      changes.delete(client.name);
+      return { ...client, ...change };
+    });
+  // Whatever is left are new clients, sent with all their fields; they
+  // are inserted in name order, the order of the snapshot
+  changes.forEach((change) => {
+    const index = next.findIndex((client) => client.name > change.name);
+    next.splice(index === -1 ? next.length : index, 0, change as ClientData);
+  });
+  return next;
+};
+
 export interface ManageData {
   // Define your data structure here
   [key: string]: unknown;
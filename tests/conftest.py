@@ -0,0 +1,58 @@
+import asyncio
+import os
+import tempfile
+from typing import AsyncGenerator, Awaitable, Callable
+
+# Settings and database engines are created when the app modules are
+# imported, so the environment has to be in place first. Set DATABASE_URL
+# to run the suite against another database, e.g. PostgreSQL.
+# Removed when the interpreter exits
+_database_dir = tempfile.TemporaryDirectory(  # pylint: disable=consider-using-with
+    prefix="backchannel-test-"
+)
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("MASTER_PASSWORD_HASH", "")
+os.environ.setdefault("ALLOWED_ORIGINS", "*")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_database_dir.name}/test.db")
+
+# pylint: disable=wrong-import-position
+import pytest_asyncio
+
+from app.core.database import close_db, init_db
+from app.services.relay import StreamPair
+
+ConnectPair = Callable[[], Awaitable[tuple[StreamPair, StreamPair]]]
+
+
+@pytest_asyncio.fixture(scope="session")
+async def database() -> AsyncGenerator[None, None]:
+    await init_db(retries=1)
+    yield
+    await close_db()
+
+
+@pytest_asyncio.fixture
+async def connect_pair() -> AsyncGenerator[ConnectPair, None]:
+    """Opens loopback TCP connections, returns the (client, server) streams"""
+    accepted: asyncio.Queue[StreamPair] = asyncio.Queue()
+
+    async def on_connect(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        await accepted.put((reader, writer))
+
+    server = await asyncio.start_server(on_connect, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    writers: list[asyncio.StreamWriter] = []
+
+    async def connect() -> tuple[StreamPair, StreamPair]:
+        client = await asyncio.open_connection("127.0.0.1", port)
+        accepted_pair = await accepted.get()
+        writers.extend((client[1], accepted_pair[1]))
+        return client, accepted_pair
+
+    yield connect
+    for writer in writers:
+        writer.close()
+    server.close()
+    await server.wait_closed()
@@ -0,0 +1,122 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.database import open_write_session
+from app.main import app
+from app.models.order import Order
+from app.services.client_registry import client_registry
+from app.services.metric_ingest import MetricQueueFullError, metric_ingestor
+
+METRIC = {
+    "uptime": 1,
+    "cpuUsage": 2,
+    "memoryUsage": 3,
+    "diskUsage": 4,
+    "temperature": 5,
+}
+
+
+def test_control_channel_survives_invalid_frames() -> None:
+    client = TestClient(app)
+    with client.websocket_connect(
+        "/api/v1/client/ws", headers={"name": "binary"}
+    ) as websocket:
+        websocket.send_bytes(b"\x00\x01")
+        assert websocket.receive_json() == {
+            "type": "error",
+            "detail": "Invalid message",
+        }
+        websocket.send_text("not json")
+        assert websocket.receive_json()["detail"] == "Invalid message"
+        websocket.send_json({"type": "pong"})
+    assert "binary" in client_registry
+
+
+async def test_metric_of_client_polling_another_worker(database: None) -> None:
+    # The row another worker flushed after the client polled it
+    db_session = await open_write_session()
+    try:
+        db_session.add(Order(name="elsewhere", username="u", polled_time=1))
+        await db_session.commit()
+    finally:
+        await db_session.close()
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.put(
+            "/api/v1/client/metric", headers={"name": "elsewhere"}, json=METRIC
+        )
+        assert response.status_code == 200
+        assert client_registry.get("elsewhere").username == "u"
+
+        response = await client.put(
+            "/api/v1/client/metric", headers={"name": "unknown"}, json=METRIC
+        )
+        assert response.status_code == 401
+        assert "unknown" not in client_registry
+    await client_registry.delete("elsewhere")
+
+
+async def test_heartbeat_polls_and_uploads(
+    database: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        queued = metric_ingestor.queue_depth
+        response = await client.post(
+            "/api/v1/client/heartbeat",
+            headers={"name": "beating", "username": "u"},
+            json=METRIC,
+        )
+        assert response.json() == {"port": None, "multiplex": False}
+        assert client_registry.get("beating").username == "u"
+        assert metric_ingestor.queue_depth == queued + 1
+
+        client_registry.set_port("beating", 4000, multiplex=True)
+
+        # A shed sample still answers the order
+        def shed(name: str, data: object) -> None:
+            raise MetricQueueFullError("Metric queue is full")
+
+        monkeypatch.setattr(metric_ingestor, "submit", shed)
+        response = await client.post(
+            "/api/v1/client/heartbeat", headers={"name": "beating"}, json=METRIC
+        )
+        assert response.status_code == 200
+        assert response.json() == {"port": 4000, "multiplex": True}
+
+        response = await client.post("/api/v1/client/heartbeat", json=METRIC)
+        assert response.status_code == 401
+    await client_registry.delete("beating")
+    await metric_ingestor.flush()
+
+
+async def test_long_poll_wait_is_capped(
+    database: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "long_poll_max_wait", 0.01)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get(
+            "/api/v1/client/order", params={"wait": 60}, headers={"name": "parked"}
+        )
+        assert response.json() == {"port": None, "multiplex": False}
+        assert client_registry.parked == 0
+    await client_registry.delete("parked")
+
+
+async def test_non_ascii_token_is_rejected() -> None:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get(
+            "/api/v1/client/order",
+            headers={"name": "accented", "token": "v1.é".encode()},
+        )
+        assert response.status_code == 401
+    assert "accented" not in client_registry
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.client_registry import ClientRegistry
+
+
+async def test_wait_for_port_times_out() -> None:
+    registry = ClientRegistry()
+    registry.poll("waiting", None)
+    assert await registry.wait_for_port("waiting", 0.01) is None
+    assert registry.parked == 0
+    assert await registry.wait_for_port("unknown", 1) is None
+
+
+async def test_set_port_wakes_parked_polls() -> None:
+    registry = ClientRegistry()
+    registry.poll("waiting", None)
+    polls = [
+        asyncio.create_task(registry.wait_for_port("waiting", 5)) for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    assert registry.parked == 2
+
+    registry.set_port("waiting", 4000)
+    assert await asyncio.wait_for(asyncio.gather(*polls), 1) == [4000, 4000]
+    assert registry.parked == 0
+    # A client that already has its port is answered without parking
+    assert await registry.wait_for_port("waiting", 5) == 4000
+
+
+async def test_parked_polls_are_capped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "long_poll_max_parked", 1)
+    registry = ClientRegistry()
+    registry.poll("first", None)
+    registry.poll("second", None)
+    parked = asyncio.create_task(registry.wait_for_port("first", 5))
+    await asyncio.sleep(0)
+
+    assert await asyncio.wait_for(registry.wait_for_port("second", 5), 1) is None
+    assert registry.parked == 1
+    registry.set_port("first", 4000)
+    assert await parked == 4000
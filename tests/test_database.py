@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from app.core.config import settings
+from app.core.database import Base, _create_missing_indexes, open_db_session
+from app.models.metric import Metric
+from app.models.order import Order
+from app.schemas.client import MetricData
+from app.services.client_registry import client_registry
+from app.services.metric_ingest import metric_ingestor
+
+requires_postgres = pytest.mark.skipif(
+    not settings.database_url.startswith("postgres"),
+    reason="DATABASE_URL is not a PostgreSQL database",
+)
+
+
+def test_unique_index_keeps_newest_duplicate(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        # A database from before the metric upsert, without the unique index
+        conn.exec_driver_sql("DROP INDEX ix_metric_name")
+        conn.execute(insert(Order), [{"name": "a"}, {"name": "b"}])
+        conn.execute(
+            insert(Metric),
+            [
+                {"name": "a", "uptime": 1},
+                {"name": "b", "uptime": 2},
+                {"name": "a", "uptime": 3},
+            ],
+        )
+
+        _create_missing_indexes(conn)
+
+        rows = conn.execute(select(Metric.name, Metric.uptime).order_by(Metric.name))
+        assert rows.all() == [("a", 3), ("b", 2)]
+    engine.dispose()
+
+
+async def upsert_metrics(name: str) -> list[tuple[str, int | None]]:
+    """Ingest two samples of one client, returns its metric rows"""
+    client_registry.poll(name, None)
+    try:
+        for uptime in (10, 20):
+            metric_ingestor.submit(
+                name,
+                MetricData(
+                    uptime=uptime,
+                    cpu_usage=1,
+                    memory_usage=2,
+                    disk_usage=3,
+                    temperature=4,
+                ),
+            )
+            await metric_ingestor.flush()
+        db_session = await open_db_session()
+        try:
+            result = await db_session.execute(
+                select(Metric.name, Metric.uptime).where(Metric.name == name)
+            )
+            return [tuple(row) for row in result]
+        finally:
+            await db_session.close()
+    finally:
+        await client_registry.delete(name)
+
+
+async def test_metric_upsert(database: None) -> None:
+    assert await upsert_metrics("upsert") == [("upsert", 20)]
+
+
+@requires_postgres
+async def test_metric_upsert_postgres(database: None) -> None:
+    """Run the suite with DATABASE_URL set to a PostgreSQL database"""
+    assert settings.database_url.startswith("postgres")
+    assert await upsert_metrics("upsert-postgres") == [("upsert-postgres", 20)]
@@ -0,0 +1,60 @@
+import asyncio
+
+from app.services.events import Event, EventBus, format_event
+
+
+async def collect(bus: EventBus, last_event_id: int | None = None) -> list[Event]:
+    bus.close()
+    return [event async for event in bus.subscribe(last_event_id)]
+
+
+def test_format_event() -> None:
+    assert format_event(3, "hello") == "id: 3\ndata: hello\n\n"
+
+
+async def test_replay_after_last_event_id() -> None:
+    bus = EventBus(maxlen=10)
+    for data in ("a", "b", "c"):
+        bus.publish(data)
+    assert [event.data for event in await collect(bus, 1)] == ["b", "c"]
+    assert [event.data for event in bus.since(2)] == ["c"]
+
+
+async def test_full_buffer_drops_oldest() -> None:
+    bus = EventBus(maxlen=2)
+    for data in ("a", "b", "c", "d"):
+        bus.publish(data)
+    assert not bus.covers(0)
+    assert bus.covers(2)
+    assert await collect(bus) == [
+        Event(2, "2 messages dropped", "dropped"),
+        Event(3, "c"),
+        Event(4, "d"),
+    ]
+
+
+async def test_id_beyond_head_subscribes_from_start() -> None:
+    # A dashboard reconnecting with the id it got before a server restart
+    bus = EventBus(maxlen=10)
+    bus.publish("a")
+    assert not bus.covers(50)
+    assert [event.data for event in await collect(bus, 50)] == ["a"]
+
+
+async def test_subscribers_wake_up_on_publish() -> None:
+    bus = EventBus(maxlen=10)
+    received: list[str] = []
+
+    async def subscriber() -> None:
+        async for event in bus.subscribe():
+            received.append(event.data)
+
+    tasks = [asyncio.create_task(subscriber()) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert bus.subscribers == 2
+    bus.publish("a")
+    bus.publish("b")
+    bus.close()
+    await asyncio.wait_for(asyncio.gather(*tasks), 1)
+    assert received == ["a", "b", "a", "b"]
+    assert bus.subscribers == 0
@@ -0,0 +1,72 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.main import app
+from app.services.client_registry import client_registry
+from app.services.events import EventBus
+from app.services.fleet_view import FleetView
+
+NAMES = ["fleet-c", "fleet-a", "fleet-b"]
+
+
+async def test_snapshot_is_ordered_by_name(database: None) -> None:
+    fleet = FleetView(interval=3600)
+    await fleet.start()
+    try:
+        for name in NAMES:
+            client_registry.poll(name, None)
+        fleet.update()
+        names = [row["name"] for row in fleet.snapshot()["clients"]]
+        assert [name for name in names if name in NAMES] == sorted(NAMES)
+    finally:
+        for name in NAMES:
+            await client_registry.delete(name)
+        await fleet.stop()
+
+
+async def test_no_stream_with_several_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "forwarder_directory", "database")
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://test",
+        cookies={settings.cookie_name: create_access_token("admin")},
+    ) as client:
+        response = await client.get("/api/v1/manage/stream")
+        assert response.status_code == 404
+
+
+async def test_stream_resnapshots_after_drop(database: None) -> None:
+    fleet = FleetView(interval=3600)
+    fleet.events = EventBus(maxlen=2)
+    await fleet.start()
+    stream = fleet.stream()
+    try:
+        assert '"type":"snapshot"' in await anext(stream)
+        for name in NAMES:
+            client_registry.poll(name, None)
+            fleet.update()
+        # The first two deltas are gone, a snapshot replaces all of them
+        snapshot = await anext(stream)
+        assert snapshot.startswith("id: 3\n")
+        assert '"type":"snapshot"' in snapshot and '"name":"fleet-c"' in snapshot
+    finally:
+        await stream.aclose()
+        for name in NAMES:
+            await client_registry.delete(name)
+        await fleet.stop()
+
+
+async def test_stopped_view_stops_listening(database: None) -> None:
+    fleet = FleetView(interval=3600)
+    await fleet.start()
+    await fleet.stop()
+    client_registry.poll("fleet-stopped", None)
+    try:
+        fleet.update()
+        assert "fleet-stopped" not in [
+            row["name"] for row in fleet.snapshot()["clients"]
+        ]
+    finally:
+        await client_registry.delete("fleet-stopped")
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from app.services import forwarder as forwarder_module
+from app.services.forwarder import Forwarder, ForwarderLimitError, ForwarderManager
+from app.services.port_pool import PortPool
+
+
+@pytest.fixture(name="pool")
+def pool_fixture(monkeypatch: pytest.MonkeyPatch) -> PortPool:
+    pool = PortPool(20000, 20100, "127.0.0.1")
+    monkeypatch.setattr(forwarder_module, "port_pool", pool)
+    return pool
+
+
+async def wait_for_log(forwarder: Forwarder, text: str) -> None:
+    async def find() -> None:
+        async for event in forwarder.events.subscribe():
+            if text in event.data:
+                return
+
+    await asyncio.wait_for(find(), 1)
+
+
+async def test_forwarder_limit(database: None, pool: PortPool) -> None:
+    manager = ForwarderManager(max_forwarders=1)
+    forwarder_id = await manager.create_forwarder("limited")
+    with pytest.raises(ForwarderLimitError):
+        await manager.create_forwarder("limited-too")
+    assert pool.leased == 2
+
+    await manager.cancel_forwarder(forwarder_id)
+    await manager.cancel_forwarder(await manager.create_forwarder("limited-too"))
+    assert pool.leased == 0
+
+
+async def test_cancel_closes_connections_and_ports(
+    database: None, pool: PortPool
+) -> None:
+    manager = ForwarderManager()
+    forwarder_id = await manager.create_forwarder("cancelled")
+    forwarder = manager.get_forwarder(forwarder_id)
+    assert forwarder is not None
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", forwarder.ports["target"]
+    )
+    await wait_for_log(forwarder, "cancelled connected.")
+
+    assert await manager.cancel_forwarder(forwarder_id)
+    assert not manager.is_forwarder_running(forwarder_id)
+    assert pool.leased == 0
+    # The waiting back-connection is closed with the forwarder
+    assert await asyncio.wait_for(reader.read(), 1) == b""
+    writer.close()
+    assert not await manager.cancel_forwarder(forwarder_id)
@@ -0,0 +1,83 @@
+import pytest
+
+from app.services import liveness as liveness_module
+from app.services.liveness import ClientStatus, LivenessTracker, TimerWheel
+
+NOW = 1_800_000_000
+
+
+def test_timer_wheel_fires_due_keys() -> None:
+    wheel = TimerWheel(slots=4)
+    wheel.schedule("a", 2)
+    wheel.schedule("b", 3)
+    wheel.schedule("late", 10)
+    # A deadline in the past fires with the next tick
+    wheel.schedule("past", -5)
+
+    assert wheel.advance(1) == ["past"]
+    wheel.schedule("b", 5)
+    assert wheel.advance(3) == ["a"]
+    wheel.cancel("b")
+    # "late" shares a slot with tick 2 and 6 but waits for its round
+    assert not wheel.advance(9)
+    assert wheel.advance(10) == ["late"]
+    assert len(wheel) == 0
+
+
+def test_timer_wheel_catches_up_after_a_pause() -> None:
+    wheel = TimerWheel(slots=4, tick=100)
+    for tick in range(101, 111):
+        wheel.schedule(f"key-{tick}", tick)
+    assert sorted(wheel.advance(1000)) == sorted(f"key-{t}" for t in range(101, 111))
+    assert wheel.tick == 1000
+    # Going back in time never moves the wheel backwards
+    assert not wheel.advance(500)
+    assert wheel.tick == 1000
+
+
+@pytest.fixture(name="tracker")
+def tracker_fixture(monkeypatch: pytest.MonkeyPatch) -> LivenessTracker:
+    monkeypatch.setattr(liveness_module, "get_time", lambda: NOW)
+    return LivenessTracker(stale_after=10, offline_after=30, tick=1, slots=8)
+
+
+def test_heartbeats_move_clients_through_states(tracker: LivenessTracker) -> None:
+    changes: list[tuple[str, ClientStatus, ClientStatus | None]] = []
+    tracker.add_listener(lambda *change: changes.append(change))
+
+    tracker.touch("a", NOW)
+    tracker.advance(NOW + 9)
+    assert tracker.status("a") == "online"
+    tracker.advance(NOW + 10)
+    assert tracker.status("a") == "stale"
+    tracker.advance(NOW + 29)
+    assert tracker.status("a") == "stale"
+    tracker.advance(NOW + 30)
+    assert changes == [
+        ("a", "online", None),
+        ("a", "stale", "online"),
+        ("a", "offline", "stale"),
+    ]
+
+    # A heartbeat brings the client back and restarts its deadlines
+    tracker.touch("a", NOW + 40)
+    tracker.advance(NOW + 49)
+    assert tracker.status("a") == "online"
+    assert changes[-1] == ("a", "online", "offline")
+
+
+def test_restore_sets_status_silently(tracker: LivenessTracker) -> None:
+    changes: list[str] = []
+    tracker.add_listener(lambda name, status, previous: changes.append(name))
+
+    assert tracker.restore("never", None) == "offline"
+    assert tracker.restore("recent", NOW - 5) == "online"
+    assert tracker.restore("quiet", NOW - 15) == "stale"
+    assert tracker.restore("gone", NOW - 60) == "offline"
+    assert tracker.counts() == {"online": 1, "stale": 1, "offline": 2}
+    assert not changes
+
+    tracker.forget("quiet")
+    tracker.advance(NOW + 15)
+    assert changes == ["recent"]
+    assert tracker.counts() == {"online": 0, "stale": 1, "offline": 2}
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import delete, func, select
+
+from app.core.database import open_db_session, open_write_session
+from app.models.metric_sample import MetricSample
+from app.schemas.client import MetricData
+from app.services import metric_history as metric_history_module
+from app.services.metric_history import RESOLUTIONS, MetricHistory
+
+NOW = 1_800_000_000
+
+
+def sample(cpu_usage: float) -> MetricData:
+    return MetricData(
+        uptime=100, cpu_usage=cpu_usage, memory_usage=1, disk_usage=2, temperature=3
+    )
+
+
+async def test_restart_keeps_one_row_per_bucket(
+    database: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(metric_history_module, "get_time", lambda: NOW)
+    db_session = await open_write_session()
+    try:
+        await db_session.execute(
+            delete(MetricSample).where(MetricSample.name == "restart")
+        )
+        await db_session.commit()
+    finally:
+        await db_session.close()
+
+    history = MetricHistory()
+    history.record("restart", sample(10))
+    history.record("restart", sample(20))
+    await history.stop()
+
+    # The restarted server receives more samples in the same buckets
+    history = MetricHistory()
+    history.record("restart", sample(60))
+    points = await history.query("restart", RESOLUTIONS["1m"], NOW - 60, NOW)
+    assert [(p.samples, p.cpu_usage, p.cpu_usage_max) for p in points] == [
+        (3, 30.0, 60.0)
+    ]
+    await history.stop()
+
+    db_session = await open_db_session()
+    try:
+        result = await db_session.execute(
+            select(
+                MetricSample.resolution,
+                func.count(),  # pylint: disable=not-callable
+                func.sum(MetricSample.samples),
+                func.max(MetricSample.cpu_usage),
+                func.max(MetricSample.cpu_usage_max),
+            )
+            .where(MetricSample.name == "restart")
+            .group_by(MetricSample.resolution, MetricSample.timestamp)
+            .order_by(MetricSample.resolution)
+        )
+        rows = result.all()
+    finally:
+        await db_session.close()
+    assert rows == [
+        (RESOLUTIONS["raw"], 1, 3, 30.0, 60.0),
+        (RESOLUTIONS["1m"], 1, 3, 30.0, 60.0),
+        (RESOLUTIONS["1h"], 1, 3, 30.0, 60.0),
+    ]
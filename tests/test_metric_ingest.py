@@ -0,0 +1,76 @@
+from typing import NoReturn
+
+import pytest
+from sqlalchemy import select
+
+from app.core.database import open_db_session
+from app.models.metric import Metric
+from app.schemas.client import MetricData
+from app.services import metric_ingest as metric_ingest_module
+from app.services.client_registry import client_registry
+from app.services.metric_ingest import MetricIngestor, MetricQueueFullError
+
+
+def sample(uptime: int) -> MetricData:
+    return MetricData(
+        uptime=uptime, cpu_usage=1, memory_usage=2, disk_usage=3, temperature=4
+    )
+
+
+async def uptime_of(name: str) -> int | None:
+    db_session = await open_db_session()
+    try:
+        result = await db_session.execute(
+            select(Metric.uptime).where(Metric.name == name)
+        )
+        return result.scalar_one_or_none()
+    finally:
+        await db_session.close()
+
+
+def test_full_queue_sheds() -> None:
+    ingestor = MetricIngestor(queue_size=2)
+    ingestor.submit("a", sample(1))
+    ingestor.submit("b", sample(1))
+    with pytest.raises(MetricQueueFullError):
+        ingestor.submit("c", sample(1))
+    assert (ingestor.accepted, ingestor.shed, ingestor.queue_depth) == (2, 1, 2)
+
+
+async def test_flush_keeps_newest_sample(database: None) -> None:
+    client_registry.poll("ingest-newest", None)
+    try:
+        ingestor = MetricIngestor()
+        for uptime in (1, 2, 3):
+            ingestor.submit("ingest-newest", sample(uptime))
+        await ingestor.flush()
+        assert (ingestor.flushed, ingestor.last_batch_size) == (1, 1)
+        assert ingestor.queue_depth == 0
+        assert await uptime_of("ingest-newest") == 3
+    finally:
+        await client_registry.delete("ingest-newest")
+
+
+async def test_failed_flush_requeues_batch(
+    database: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def broken_session() -> NoReturn:
+        # A sample submitted while the write is in flight
+        ingestor.submit("ingest-retry", sample(2))
+        raise ConnectionError("database is down")
+
+    client_registry.poll("ingest-retry", None)
+    try:
+        ingestor = MetricIngestor(queue_size=2)
+        ingestor.submit("ingest-retry", sample(1))
+        ingestor.submit("ingest-other", sample(1))
+        with monkeypatch.context() as patch:
+            patch.setattr(metric_ingest_module, "open_write_session", broken_session)
+            with pytest.raises(ConnectionError):
+                await ingestor.flush()
+        assert (ingestor.queue_depth, ingestor.shed) == (2, 0)
+
+        await ingestor.flush()
+        assert await uptime_of("ingest-retry") == 2
+    finally:
+        await client_registry.delete("ingest-retry")
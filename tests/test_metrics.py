@@ -0,0 +1,26 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.main import app
+
+
+async def test_metrics_require_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        monkeypatch.setattr(settings, "metrics_token", "")
+        assert (await client.get("/metrics")).status_code == 404
+
+        monkeypatch.setattr(settings, "metrics_token", "scrape")
+        assert (await client.get("/metrics")).status_code == 401
+        response = await client.get(
+            "/metrics", headers={"Authorization": "Bearer scrape"}
+        )
+        assert response.status_code == 200
+        assert "backchannel_" in response.text
+        # A header that is not ASCII is a mismatch, not an error
+        response = await client.get(
+            "/metrics", headers={"Authorization": "Bearer scräpe".encode()}
+        )
+        assert response.status_code == 401
@@ -0,0 +1,135 @@
+import asyncio
+from typing import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+
+from app.services.multiplex import (
+    FRAME_HEADER,
+    WINDOW_UPDATE,
+    FrameType,
+    Multiplexer,
+    MultiplexError,
+)
+from app.services.relay import StreamPair
+from tests.conftest import ConnectPair
+
+Frame = tuple[int, int, bytes]
+
+
+def frame(stream_id: int, frame_type: FrameType, payload: bytes = b"") -> bytes:
+    return FRAME_HEADER.pack(stream_id, frame_type, len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Frame:
+    stream_id, frame_type, size = FRAME_HEADER.unpack(
+        await asyncio.wait_for(reader.readexactly(FRAME_HEADER.size), 1)
+    )
+    return stream_id, frame_type, await reader.readexactly(size)
+
+
+class Tunnel:
+    """A multiplexer on the server end of a back-connection, and its client end"""
+
+    def __init__(
+        self, connect_pair: ConnectPair, client: StreamPair, server: StreamPair
+    ) -> None:
+        self.connect_pair = connect_pair
+        self.client_reader, self.client_writer = client
+        self.log: list[str] = []
+        self.multiplexer = Multiplexer(
+            *server,
+            window=128,
+            max_frame=256,
+            max_streams=2,
+            on_sent=lambda size: None,
+            on_received=lambda size: None,
+            log=self.log.append,
+        )
+        self.running = asyncio.create_task(self.multiplexer.run())
+        self.streams: list[asyncio.Task[None]] = []
+
+    async def open_stream(self) -> StreamPair:
+        """Connect an operator, returns its end once the client saw OPEN"""
+        operator, accepted = await self.connect_pair()
+        self.streams.append(
+            asyncio.create_task(self.multiplexer.open_stream(*accepted))
+        )
+        assert await read_frame(self.client_reader) == (
+            len(self.streams),
+            FrameType.OPEN,
+            WINDOW_UPDATE.pack(128),
+        )
+        return operator
+
+    def send(self, stream_id: int, frame_type: FrameType, payload: bytes = b"") -> None:
+        self.client_writer.write(frame(stream_id, frame_type, payload))
+
+    async def close(self) -> None:
+        self.multiplexer.close()
+        self.running.cancel()
+        await asyncio.gather(self.running, *self.streams, return_exceptions=True)
+
+
+@pytest_asyncio.fixture(name="tunnel")
+async def tunnel_fixture(connect_pair: ConnectPair) -> AsyncGenerator[Tunnel, None]:
+    client, server = await connect_pair()
+    tunnel = Tunnel(connect_pair, client, server)
+    yield tunnel
+    await tunnel.close()
+
+
+async def test_stream_round_trip(tunnel: Tunnel) -> None:
+    operator_reader, operator_writer = await tunnel.open_stream()
+    operator_writer.write(b"hello")
+    assert await read_frame(tunnel.client_reader) == (1, FrameType.DATA, b"hello")
+
+    tunnel.send(1, FrameType.DATA, b"world")
+    assert await operator_reader.readexactly(5) == b"world"
+    # Credit comes back once the data was written to the operator
+    assert await read_frame(tunnel.client_reader) == (
+        1,
+        FrameType.WINDOW,
+        WINDOW_UPDATE.pack(5),
+    )
+
+    operator_writer.write_eof()
+    assert await read_frame(tunnel.client_reader) == (1, FrameType.FIN, b"")
+    tunnel.send(1, FrameType.FIN)
+    assert await asyncio.wait_for(operator_reader.read(), 1) == b""
+
+
+async def test_sending_waits_for_credit(tunnel: Tunnel) -> None:
+    _, operator_writer = await tunnel.open_stream()
+    operator_writer.write(bytes(300))
+
+    received = 0
+    while received < 128:
+        stream_id, frame_type, payload = await read_frame(tunnel.client_reader)
+        assert (stream_id, frame_type) == (1, FrameType.DATA)
+        received += len(payload)
+    assert received == 128
+    with pytest.raises(asyncio.TimeoutError):
+        await read_frame(tunnel.client_reader)
+
+    tunnel.send(1, FrameType.WINDOW, WINDOW_UPDATE.pack(1000))
+    while received < 300:
+        received += len((await read_frame(tunnel.client_reader))[2])
+    assert received == 300
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        # Rejected before the (never sent) payload is read
+        FRAME_HEADER.pack(1, FrameType.DATA, 2**32 - 1),
+        FRAME_HEADER.pack(1, FrameType.DATA, 200),
+        FRAME_HEADER.pack(1, FrameType.WINDOW, 2),
+    ],
+    ids=["oversized", "beyond-window", "short-window-update"],
+)
+async def test_protocol_violations(tunnel: Tunnel, header: bytes) -> None:
+    await tunnel.open_stream()
+    tunnel.client_writer.write(header)
+    with pytest.raises(MultiplexError):
+        await asyncio.wait_for(tunnel.running, 1)
@@ -0,0 +1,89 @@
+import asyncio
+import socket
+
+import pytest
+
+from app.services.port_pool import PortPool, PortPoolExhaustedError
+
+
+async def handler(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    writer.close()
+
+
+def free_ports(count: int) -> tuple[int, int]:
+    """A range of `count` consecutive ports that can be bound right now"""
+    for start in range(41000, 60000, count):
+        try:
+            for port in range(start, start + count):
+                with socket.socket() as sock:
+                    sock.bind(("127.0.0.1", port))
+        except OSError:
+            continue
+        return start, start + count - 1
+    raise RuntimeError("no free port range")
+
+
+async def test_lease_and_release() -> None:
+    start, end = free_ports(2)
+    pool = PortPool(start, end, "127.0.0.1")
+    server, port = await pool.lease(handler)
+    assert port == start
+    assert (pool.leased, pool.available) == (1, 1)
+
+    await pool.close(server, port)
+    assert (pool.leased, pool.available) == (0, 2)
+    # Released ports are reused last
+    server, port = await pool.lease(handler)
+    assert port == end
+    await pool.close(server, port)
+
+
+async def test_reserved_and_taken_ports_are_skipped() -> None:
+    start, end = free_ports(3)
+    pool = PortPool(start, end, "127.0.0.1")
+    pool.reserved = {start}
+    assert pool.available == 2
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", start + 1))
+        taken.listen()
+        server, port = await pool.lease(handler)
+        assert port == end
+        assert pool.bind_failures == 1
+
+        with pytest.raises(PortPoolExhaustedError):
+            await pool.lease(handler)
+        assert pool.exhausted == 1
+    await pool.close(server, port)
+
+
+async def test_concurrent_bind_failures_exhaust_cleanly() -> None:
+    start, end = free_ports(3)
+    pool = PortPool(start, end, "127.0.0.1")
+    taken = [socket.socket() for _ in range(3)]
+    try:
+        for port, sock in enumerate(taken, start):
+            sock.bind(("127.0.0.1", port))
+            sock.listen()
+        results = await asyncio.gather(
+            *(pool.lease(handler) for _ in range(5)), return_exceptions=True
+        )
+    finally:
+        for sock in taken:
+            sock.close()
+    assert all(isinstance(result, PortPoolExhaustedError) for result in results)
+    assert pool.available == 3
+
+
+async def test_concurrent_leases_exhaust_cleanly() -> None:
+    start, end = free_ports(3)
+    pool = PortPool(start, end, "127.0.0.1")
+    results = await asyncio.gather(
+        *(pool.lease(handler) for _ in range(5)), return_exceptions=True
+    )
+    servers = [result for result in results if isinstance(result, tuple)]
+    errors = [result for result in results if isinstance(result, BaseException)]
+    assert sorted(port for _, port in servers) == [start, start + 1, end]
+    assert len(errors) == 2
+    assert all(isinstance(error, PortPoolExhaustedError) for error in errors)
+    for server, port in servers:
+        await pool.close(server, port)
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from app.services.relay import (
+    ENGINE_PRIORITY,
+    RelayEngine,
+    get_relay_engines,
+)
+from tests.conftest import ConnectPair
+
+ENGINES = {engine.name: engine for engine in get_relay_engines("auto", 4096)}
+
+
+@pytest.mark.parametrize("name", ENGINE_PRIORITY)
+async def test_engine_relays_until_eof(name: str, connect_pair: ConnectPair) -> None:
+    engine: RelayEngine = ENGINES[name]
+    (source_client, source), (target_client, target) = (
+        await connect_pair(),
+        await connect_pair(),
+    )
+    if not engine.supports(source[1]):
+        pytest.skip(f"{name} is not supported here")
+
+    # Sent before the engine takes over, so it sits in the stream buffer
+    source_client[1].write(b"early ")
+    await source_client[1].drain()
+    await asyncio.sleep(0.05)
+
+    source_end, target_end = await engine.open(source, target)
+    chunks: list[int] = []
+    relay = asyncio.create_task(engine.relay(source_end, target_end, chunks.append))
+
+    payload = bytes(range(256)) * 64
+    source_client[1].write(payload)
+    source_client[1].write_eof()
+    await asyncio.wait_for(relay, 5)
+    target_end.shutdown_write()
+
+    assert await target_client[0].read() == b"early " + payload
+    assert sum(chunks) == len(b"early " + payload)
+    assert max(chunks) <= 4096
+    await source_end.close()
+    await target_end.close()
+
+
+def test_engines_follow_preference() -> None:
+    assert [e.name for e in get_relay_engines("socket", 1024)] == ["socket", "stream"]
+    assert [e.name for e in get_relay_engines("auto", 1024)] == list(ENGINE_PRIORITY)
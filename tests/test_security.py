@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core import security as security_module
+from app.core.security import (
+    ClientTokenSigner,
+    LoginBusyError,
+    LoginThrottle,
+    PasswordVerifier,
+    TokenCache,
+    create_access_token,
+    manager,
+)
+
+
+def test_token_cache_evicts_least_recently_used() -> None:
+    cache = TokenCache(size=2, ttl=60)
+    cache.put("a", "user-a")
+    cache.put("b", "user-b")
+    assert cache.get("a") == "user-a"
+    cache.put("c", "user-c")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (
+        "user-a",
+        None,
+        "user-c",
+    )
+    assert (len(cache), cache.hits, cache.misses) == (2, 3, 1)
+
+
+def test_token_cache_honours_expiry() -> None:
+    cache = TokenCache(size=2, ttl=60)
+    cache.put("expired", "user", expires=0)
+    assert cache.get("expired") is None
+    assert len(cache) == 0
+
+    disabled = TokenCache(size=0, ttl=60)
+    disabled.put("token", "user")
+    assert disabled.get("token") is None
+
+
+async def test_login_manager_caches_verified_tokens() -> None:
+    token = create_access_token("admin")
+    hits = manager.token_cache.hits
+    first = await manager.get_current_user(token)
+    assert first.username == "admin"
+    assert await manager.get_current_user(token) is first
+    assert manager.token_cache.hits == hits + 1
+
+
+def test_login_throttle_locks_out(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [1000.0]
+    monkeypatch.setattr(security_module.time, "monotonic", lambda: now[0])
+    throttle = LoginThrottle(max_failures=2, lockout=60)
+
+    throttle.failure("10.0.0.1")
+    assert throttle.retry_after("10.0.0.1") == 0
+    throttle.failure("10.0.0.1")
+    now[0] += 10
+    assert throttle.retry_after("10.0.0.1") == 50
+    assert throttle.retry_after("10.0.0.2") == 0
+    assert throttle.rejected == 1
+
+    now[0] += 50
+    assert throttle.retry_after("10.0.0.1") == 0
+    # A failure after the lockout starts counting again
+    throttle.failure("10.0.0.1")
+    assert throttle.retry_after("10.0.0.1") == 0
+
+    throttle.failure("10.0.0.1")
+    throttle.success("10.0.0.1")
+    assert throttle.retry_after("10.0.0.1") == 0
+
+
+async def test_password_verifier_refuses_beyond_queue(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    release = threading.Event()
+
+    def slow_check(password: str) -> bool:
+        release.wait(5)
+        return password == "secret"
+
+    monkeypatch.setattr(security_module, "verify_master_password", slow_check)
+    verifier = PasswordVerifier(workers=1, queue=1)
+    running = [asyncio.create_task(verifier.verify(p)) for p in ("secret", "wrong")]
+    await asyncio.sleep(0)
+
+    with pytest.raises(LoginBusyError):
+        await verifier.verify("secret")
+    assert verifier.rejected == 1
+
+    release.set()
+    assert await asyncio.gather(*running) == [True, False]
+    assert await verifier.verify("secret")
+
+
+def test_client_tokens() -> None:
+    signer = ClientTokenSigner("key", "secret", required=False)
+    token = signer.issue("alpha")
+    assert token.startswith("v1.")
+    assert signer.check("alpha", token)
+    assert signer.check("alpha", None)
+    assert not signer.check("beta", token)
+    assert not signer.check("alpha", token.upper())
+    # Header values are latin-1, a non-ASCII token is a mismatch
+    assert not signer.check("alpha", "v1.\xe9")
+    assert signer.rejected == 3
+
+    # Another key revokes every token, the secret key derives the default one
+    assert not ClientTokenSigner("other", "secret", False).check("alpha", token)
+    derived = ClientTokenSigner("", "secret", required=True)
+    assert derived.check("alpha", ClientTokenSigner("", "secret", False).issue("alpha"))
+    assert not derived.check("alpha", None)
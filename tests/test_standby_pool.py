@@ -0,0 +1,103 @@
+import asyncio
+import socket
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+import pytest_asyncio
+
+from app.services.relay import StreamPair
+from app.services.standby_pool import StandbyPool
+
+StandbyFactory = Callable[..., Awaitable[tuple[StandbyPool, int]]]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+    return port
+
+
+@pytest_asyncio.fixture(name="make_pool")
+async def make_pool_fixture() -> AsyncGenerator[StandbyFactory, None]:
+    pools: list[StandbyPool] = []
+
+    async def make_pool(**kwargs: Any) -> tuple[StandbyPool, int]:
+        """A started pool for clients "a" and "b", and its port"""
+        port = free_port()
+        pool = StandbyPool(port=port, clients="a,b", **kwargs)
+        await pool.start()
+        pools.append(pool)
+        return pool, port
+
+    yield make_pool
+    for pool in pools:
+        await pool.stop()
+
+
+async def hello(port: int, line: bytes) -> tuple[StreamPair, bytes]:
+    """Open a standby connection, returns it and the answer to `line`"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(line)
+    return (reader, writer), await asyncio.wait_for(reader.readline(), 1)
+
+
+async def test_handshake(make_pool: StandbyFactory) -> None:
+    pool, port = await make_pool(max_per_client=1, max_total=2)
+
+    assert (await hello(port, b"HELLO a\n"))[1] == b"OK\n"
+    assert (await hello(port, b"HELLO a\n"))[1] == b"BUSY\n"
+    assert (await hello(port, b"HELLO c\n"))[1] == b"DENIED\n"
+    assert (await hello(port, b"GET / HTTP/1.1\n"))[1] == b"DENIED\n"
+    assert (pool.parked, pool.rejected) == (1, 1)
+
+    # An over-long line is refused instead of failing the handler
+    (reader, writer), answer = await hello(port, b"x" * 100_000)
+    assert answer == b""
+    assert await asyncio.wait_for(reader.read(), 1) == b""
+    writer.close()
+    assert pool.rejected == 2
+
+
+async def test_claim_hands_over_connection(make_pool: StandbyFactory) -> None:
+    pool, port = await make_pool()
+    (reader, writer), _ = await hello(port, b"HELLO a\n")
+
+    async def client() -> None:
+        assert await reader.readline() == b"CONNECT MUX\n"
+        writer.write(b"READY\n")
+
+    answering = asyncio.create_task(client())
+    claimed = await pool.claim("a", multiplex=True)
+    await answering
+    assert claimed is not None
+    assert (pool.hits, pool.parked) == (1, 0)
+
+    # Nothing parked, and clients that are not selected never are
+    assert await pool.claim("a") is None
+    assert await pool.claim("c") is None
+    assert pool.misses == 1
+    claimed[1].close()
+    writer.close()
+
+
+async def test_keepalive_drops_silent_connections(make_pool: StandbyFactory) -> None:
+    pool, port = await make_pool(keepalive_interval=0.05)
+    (alive_reader, alive_writer), _ = await hello(port, b"HELLO a\n")
+    (silent_reader, silent_writer), _ = await hello(port, b"HELLO b\n")
+
+    for _ in range(3):
+        assert await asyncio.wait_for(alive_reader.readline(), 1) == b"PING\n"
+        alive_writer.write(b"PONG\n")
+    assert await asyncio.wait_for(silent_reader.read(), 1) == b"PING\n"
+    assert (pool.parked, pool.expired) == (1, 1)
+    alive_writer.close()
+    silent_writer.close()
+
+
+async def test_old_connections_are_recycled(make_pool: StandbyFactory) -> None:
+    pool, port = await make_pool(keepalive_interval=0.05, max_age=0.05)
+    (reader, writer), _ = await hello(port, b"HELLO a\n")
+
+    assert await asyncio.wait_for(reader.read(), 1) == b"CLOSE\n"
+    assert (pool.parked, pool.recycled) == (0, 1)
+    writer.close()
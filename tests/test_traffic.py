@@ -0,0 +1,39 @@
+from app.services.traffic import TrafficCounters, format_bytes
+
+
+def test_format_bytes() -> None:
+    assert format_bytes(512) == "512 B"
+    assert format_bytes(1536) == "1.5 KiB"
+    assert format_bytes(3 * 1024**2) == "3.0 MiB"
+    assert format_bytes(5 * 1024**3) == "5.0 GiB"
+
+
+def test_summary_only_when_traffic_moved() -> None:
+    traffic = TrafficCounters()
+    assert traffic.summary() is None
+
+    upstream = traffic.direction("source->target")
+    assert traffic.direction("source->target") is upstream
+    upstream.add(1024)
+    upstream.add(1024)
+    traffic.direction("target->source").add(10)
+
+    summary = traffic.summary() or ""
+    assert summary.startswith("traffic: source->target 2.0 KiB (2 chunks, ")
+    assert "target->source 10 B (1 chunks, " in summary
+    assert traffic.total_bytes == 2058
+
+    # Nothing moved since the last summary
+    assert traffic.summary() is None
+    assert (traffic.summary(final=True) or "").startswith("traffic total: ")
+
+
+def test_peak_rate_is_kept() -> None:
+    traffic = TrafficCounters()
+    counters = traffic.direction("source->target")
+    counters.add(1000)
+    assert counters.take_rate(1.0) == 1000
+    counters.add(100)
+    assert counters.take_rate(1.0) == 100
+    assert counters.peak_rate == 1000
+    assert counters.take_rate(0) == 0
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from app.services import tunnel_policy as tunnel_policy_module
+from app.services.forwarder import Forwarder
+from app.services.tunnel_policy import TokenBucket, TunnelPolicy
+from tests.conftest import ConnectPair
+
+
+def test_token_bucket_paces_overdraw(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr(tunnel_policy_module.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(1000)
+
+    assert bucket.consume(400) == 0.0
+    # A chunk larger than what is left goes through, the debt is the pause
+    assert bucket.consume(1100) == pytest.approx(0.5)
+    now[0] += 0.5
+    assert bucket.consume(0) == 0.0
+
+    # Idle time refills the bucket up to one second worth of tokens
+    now[0] += 60
+    assert bucket.consume(1000) == 0.0
+    assert bucket.consume(100) == pytest.approx(0.1)
+
+
+def test_policy_describe() -> None:
+    assert TunnelPolicy(0, 0, 0).describe() is None
+    assert not TunnelPolicy(0, 0, 2048).has_timeouts
+    assert TunnelPolicy(30, 3600, 2048).describe() == (
+        "idle timeout 30s, max lifetime 3600s, bandwidth 2.0 KiB/s"
+    )
+
+
+async def relay_until_closed(
+    forwarder: Forwarder, connect_pair: ConnectPair, traffic_for: float = 0
+) -> tuple[float, list[str]]:
+    """Relay one connection, sending a byte every 10ms for `traffic_for` seconds
+
+    Returns how long the relay ran and the forwarder log.
+    """
+    (source_client, source), (_, target) = await connect_pair(), await connect_pair()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    relay = asyncio.create_task(forwarder.handle_connection(*source, *target))
+    while loop.time() - started < traffic_for and not relay.done():
+        source_client[1].write(b".")
+        await asyncio.sleep(0.01)
+    await asyncio.wait_for(relay, 2)
+    return loop.time() - started, [event.data for event in forwarder.events.since(0)]
+
+
+async def test_idle_timeout_waits_for_silence(connect_pair: ConnectPair) -> None:
+    forwarder = Forwarder("idle", 5, TunnelPolicy(0.1, 0, 0))
+    elapsed, log = await relay_until_closed(forwarder, connect_pair, traffic_for=0.3)
+    assert elapsed >= 0.4
+    assert "Idle for 0.1s" in " ".join(log)
+
+
+async def test_max_lifetime_closes_busy_relay(connect_pair: ConnectPair) -> None:
+    forwarder = Forwarder("lifetime", 5, TunnelPolicy(0, 0.2, 0))
+    elapsed, log = await relay_until_closed(forwarder, connect_pair, traffic_for=5)
+    assert elapsed < 1
+    assert "Maximum lifetime of 0.2s reached" in " ".join(log)